@@ -1,17 +1,49 @@
-from onvif.client import ONVIFService, ONVIFCamera, SERVICES
+""" ONVIF client
+
+Importing the package is cheap: zeep, lxml and aiohttp are only loaded when
+one of the client classes is first accessed.
+"""
+from importlib import import_module
+
 from onvif.exceptions import ONVIFError, ERR_ONVIF_UNKNOWN, \
         ERR_ONVIF_PROTOCOL, ERR_ONVIF_WSDL, ERR_ONVIF_BUILD
+from onvif.definition import SERVICES
 #from onvif import cli
-import zeep
 
-# Monkey patch zeep
-def zeep_pythonvalue(self, xmlvalue):
-        return xmlvalue
-# pylint: disable=no-member
-zeep.xsd.simple.AnySimpleType.pythonvalue = zeep_pythonvalue
+# Lazily imported names, and the module defining them
+_LAZY = {
+    'ONVIFService'  : 'onvif.client',
+    'ONVIFCamera'   : 'onvif.client',
+    'SearchSession' : 'onvif.search',
+    'mergeSearches' : 'onvif.search',
+    'ShardedFleet'  : 'onvif.shard',
+    'fetchSnapshots': 'onvif.snapshot',
+    'PollScheduler' : 'onvif.scheduler',
+    'Setting'       : 'onvif.configure',
+    'pushConfiguration': 'onvif.configure',
+    'EventStateTable': 'onvif.eventstate',
+    'SnapshotStore' : 'onvif.drift',
+}
+
+
+def __getattr__(name):
+    try:
+        module = _LAZY[name]
+    except KeyError:
+        raise AttributeError("module 'onvif' has no attribute %r" % name)
+    value = globals()[name] = getattr(import_module(module), name)
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
 
 __all__ = ( 'ONVIFService', 'ONVIFCamera', 'ONVIFError',
             'ERR_ONVIF_UNKNOWN', 'ERR_ONVIF_PROTOCOL',
             'ERR_ONVIF_WSDL', 'ERR_ONVIF_BUILD',
-            'SERVICES'#, 'cli'
+            'SERVICES', 'SearchSession', 'mergeSearches',
+            'ShardedFleet', 'fetchSnapshots', 'PollScheduler',
+            'Setting', 'pushConfiguration', 'EventStateTable',
+            'SnapshotStore'#, 'cli'
            )
@@ -0,0 +1,118 @@
+""" HTTP authentication helpers (RFC 7616 Digest and Basic)
+"""
+import hashlib
+import os
+import re
+from base64 import b64encode
+
+PARAM = re.compile(r'([\w-]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^,\s]*)')
+
+HASHES = {
+    'MD5'     : hashlib.md5,
+    'SHA-256' : hashlib.sha256,
+}
+
+
+def parseChallenge(header):
+    """ split a WWW-Authenticate header into its scheme and parameters
+    """
+    scheme, _, params = header.strip().partition(' ')
+    return scheme.lower(), {key.lower(): value.strip('"')
+                            for key, value in PARAM.findall(params)}
+
+
+def pickChallenge(headers):
+    """ pick the strongest challenge among WWW-Authenticate headers:
+    Digest over Basic; returns `(scheme, params)` or `(None, {})`
+    """
+    challenges = dict(parseChallenge(header) for header in headers)
+    for scheme in ('digest', 'basic'):
+        if scheme in challenges:
+            return scheme, challenges[scheme]
+    return None, {}
+
+
+def basicAuthorization(user, passwd):
+    return 'Basic ' + b64encode(('%s:%s' % (user, passwd)).encode('latin1')).decode()
+
+
+def digestAuthorization(challenge, method, uri, user, passwd, nc=1, cnonce=None):
+    """ Authorization header answering the Digest `challenge`
+    """
+    algorithm = challenge.get('algorithm', 'MD5')
+    session = algorithm.upper().endswith('-SESS')
+    try:
+        hashFunc = HASHES[algorithm[:-5] if session else algorithm]
+    except KeyError:
+        raise ValueError('Unsupported digest algorithm %s' % algorithm)
+
+    def H(value):
+        return hashFunc(value.encode()).hexdigest()
+
+    realm = challenge.get('realm', '')
+    nonce = challenge['nonce']
+    qops = [qop.strip() for qop in challenge.get('qop', '').split(',')]
+    qop = 'auth' if 'auth' in qops else None
+    cnonce = cnonce or os.urandom(8).hex()
+    ncValue = '%08x' % nc
+
+    ha1 = H('%s:%s:%s' % (user, realm, passwd))
+    if session:
+        ha1 = H('%s:%s:%s' % (ha1, nonce, cnonce))
+    ha2 = H('%s:%s' % (method, uri))
+    if qop:
+        response = H('%s:%s:%s:%s:%s:%s' % (ha1, nonce, ncValue, cnonce, qop, ha2))
+    else:
+        response = H('%s:%s:%s' % (ha1, nonce, ha2))
+
+    fields = ['username="%s"' % user, 'realm="%s"' % realm, 'nonce="%s"' % nonce,
+              'uri="%s"' % uri, 'response="%s"' % response, 'algorithm=%s' % algorithm]
+    if 'opaque' in challenge:
+        fields.append('opaque="%s"' % challenge['opaque'])
+    if qop:
+        fields += ['qop=%s' % qop, 'nc=%s' % ncValue, 'cnonce="%s"' % cnonce]
+    return 'Digest ' + ', '.join(fields)
+
+
+class HTTPAuth:
+    """
+    HTTP credentials of a camera, remembering the last challenge of the
+    server. Once a Digest challenge is known, requests are authorized
+    pre-emptively with an incremented nonce count, which saves the 401
+    round-trip; a new challenge is only needed when the nonce gets stale.
+    """
+    def __init__(self, user, passwd):
+        self.user = user
+        self.passwd = passwd
+        self.scheme = None
+        self.challenge = None
+        self.nc = 0
+
+    def authorization(self, method, uri):
+        """ Authorization header for a request, None if no challenge is known yet
+        """
+        if self.scheme == 'digest':
+            self.nc += 1
+            return digestAuthorization(self.challenge, method, uri,
+                                       self.user, self.passwd, self.nc)
+        if self.scheme == 'basic':
+            return basicAuthorization(self.user, self.passwd)
+        return None
+
+    def update(self, headers, sent=None):
+        """ take the WWW-Authenticate `headers` of a 401 response into account;
+        returns True if the request should be sent again, `sent` being the
+        Authorization header of the rejected request
+        """
+        scheme, params = pickChallenge(headers)
+        if scheme == 'digest':
+            stale = params.get('stale', '').lower() == 'true'
+            retry = sent is None or stale or 'nonce="%s"' % params.get('nonce') not in sent
+            self.challenge = params
+            self.nc = 0
+        elif scheme == 'basic':
+            retry = sent is None or not sent.startswith('Basic ')
+        else:
+            return False
+        self.scheme = scheme
+        return retry
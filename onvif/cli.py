@@ -6,9 +6,7 @@ from cmd import Cmd
 from ast import literal_eval
 from argparse import ArgumentParser, REMAINDER
 
-from zeep.exceptions import LookupError as MethodNotFound
-from zeep.xsd import String as Text
-from onvif import ONVIFCamera, ONVIFService, ONVIFError
+from onvif import ONVIFError
 from onvif.definition import SERVICES
 import os.path
 
@@ -32,6 +30,7 @@ class ONVIFCLI(Cmd):
 
     def setup(self, args):
         ''' `args`: Instance of `argparse.ArgumentParser` '''
+        from onvif import ONVIFCamera
         # Create onvif camera client
         self.client = ONVIFCamera(args.host, args.port,
                                   args.user, args.password,
@@ -52,6 +51,9 @@ class ONVIFCLI(Cmd):
 
     def do_cmd(self, line):
         '''Usage: CMD service operation [parameters]'''
+        from zeep.exceptions import LookupError as MethodNotFound
+        from zeep.xsd import String as Text
+        from onvif import ONVIFService
         try:
             args = self.cmd_parser.parse_args(line.split())
         except ValueError as err:
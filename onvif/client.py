@@ -1,23 +1,47 @@
 """ ONVIF API
 """
 import logging
+from collections import OrderedDict
 from datetime import datetime
+from functools import partial
 from os import environ
 from pathlib import Path
 from threading import RLock
 
+from lxml import etree
 from zeep.asyncio import AsyncTransport
 from zeep.client import Client, Settings
+from zeep.exceptions import Fault, TransportError, LookupError as ZeepLookupError
+from zeep.wsdl import Document
 from zeep.wsse.username import UsernameToken
-import zeep.helpers
+from zeep.xsd.valueobjects import AnyObject, CompoundValue
+import zeep.xsd
 
+from .auth import HTTPAuth
+from .drift import sweep
 from .exceptions import ONVIFError
 from .definition import SERVICES
+from .profiles import getProfiles
+from .projection import compile as compileProjection
+from .raw import RawResponse, checkFault
+from .search import SearchSession
+from .serialize import toDict
+from .snapshot import fetchSnapshot, hostLimiter
+from .transport import HTTPCompression, ONVIFTransport
 
 logger = logging.getLogger('onvif')
-logging.basicConfig(level=logging.INFO)
 logging.getLogger('zeep.client').setLevel(logging.CRITICAL)
 
+# Fault codes of requests rejected for their credentials
+AUTH_FAULTS = frozenset(('NotAuthorized', 'FailedAuthentication'))
+
+
+# Monkey patch zeep
+def zeep_pythonvalue(self, xmlvalue):
+    return xmlvalue
+# pylint: disable=no-member
+zeep.xsd.simple.AnySimpleType.pythonvalue = zeep_pythonvalue
+
 
 # Ensure methods to raise an ONVIFError Exception
 # when some thing was wrong
@@ -54,6 +78,136 @@ class UsernameDigestTokenDtDiff(UsernameToken):
         return result
 
 
+class WSDLCache:
+    """
+    Parsed WSDL documents, shared by every service using the same file.
+    Parsing the ONVIF schemas is by far the most expensive part of creating
+    a service, so it is done once per file and per process.
+    Documents are also keyed by the binding classes of the transport: the
+    bindings of a document parsed for a sync transport can't send async requests.
+    """
+    settings = Settings(strict=False, xml_huge_tree=True)
+    documents = {}
+    prototypes = {}
+    lock = RLock()
+    
+    @classmethod
+    def get(cls, url: Path, transport):
+        """ get (and maybe parse) document from cache
+        """
+        key = str(url), tuple(getattr(transport, 'binding_classes', None) or ())
+        with cls.lock:
+            document = cls.documents.get(key)
+            if document is None:
+                document = cls.documents[key] = \
+                    Document(key[0], transport, settings=cls.settings)
+        return document
+    
+    @classmethod
+    def parsed(cls, url: Path):
+        """ any document of `url` already in cache, whatever its transport;
+        None if the file wasn't parsed yet
+        """
+        path = str(url)
+        with cls.lock:
+            for (documentPath, _), document in cls.documents.items():
+                if documentPath == path:
+                    return document
+        return None
+    
+    @classmethod
+    def prototype(cls, url: Path, namespace, name):
+        """ get (and maybe build) a pristine instance of element `name` of
+        `namespace`, defined in the (already parsed) document of `url`
+        """
+        key = (str(url), namespace, name)
+        try:
+            return cls.prototypes[key]
+        except KeyError:
+            pass
+        with cls.lock:
+            document = cls.parsed(url)
+            if document is None:
+                raise KeyError(key[0])
+            prototype = cls.prototypes[key] = \
+                document.types.get_element('{%s}%s' % (namespace, name))()
+        return prototype
+    
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.documents.clear()
+            cls.prototypes.clear()
+
+
+def authFailed(err):
+    """ whether `err` is an authentication failure: HTTP 401, or a
+    NotAuthorized (or WS-Security FailedAuthentication) fault
+    """
+    if isinstance(err, TransportError):
+        return err.status_code == 401
+    if isinstance(err, Fault):
+        codes = [err.code] + list(err.subcodes or ())
+        return any(str(code).rpartition('}')[2].rpartition(':')[2] in AUTH_FAULTS
+                   for code in codes if code is not None)
+    return False
+
+
+def capabilityXAddrs(capabilities):
+    """ `(name, XAddr)` of the services of a GetCapabilities response,
+    including those nested in Extension
+    """
+    extension = capabilities['Extension']
+    for caps in (capabilities, extension) if extension is not None else (capabilities,):
+        for name in caps:
+            capability = caps[name]
+            if name == '_value_1':
+                # Recording, search, replay, ... capabilities: the schema lets
+                # Extension start with any element, so zeep keeps them as XML
+                for element in capability or ():
+                    if isinstance(getattr(element, 'tag', None), str):
+                        yield etree.QName(element).localname, element.findtext('{*}XAddr')
+            elif capability is not None and not isinstance(capability, (str, list)):
+                try:
+                    yield name, capability['XAddr']
+                except (KeyError, AttributeError):
+                    pass
+
+
+def clone(value):
+    """ copy of a zeep object, e.g. to send a modified request built from a
+    prototype: zeep objects, lists and dicts are copied, other values are shared
+    """
+    if isinstance(value, CompoundValue):
+        new = object.__new__(type(value))
+        new.__dict__.update(value.__dict__)
+        new.__values__ = OrderedDict((key, clone(item))
+                                     for key, item in value.__values__.items())
+        return new
+    if isinstance(value, list):
+        return [clone(item) for item in value]
+    if isinstance(value, dict):
+        return {key: clone(item) for key, item in value.items()}
+    if isinstance(value, AnyObject):
+        return AnyObject(value.xsd_obj, clone(value.value))
+    return value
+
+
+class CachedClient(Client):
+    """ zeep client built on a document from `WSDLCache`
+    """
+    def __init__(self, document, wsse=None, transport=None):  #pylint: disable=super-init-not-called
+        self.settings = document.settings
+        self.transport = transport
+        self.wsdl = document
+        self.wsse = wsse
+        self.plugins = []
+        self._default_service = None
+        self._default_service_name = None
+        self._default_port_name = None
+        self._default_soapheaders = None
+
+
 class ONVIFService:
     """
     Python Implemention for ONVIF Service.
@@ -95,26 +249,28 @@ class ONVIFService:
         
         if not transport:
             transport = AsyncTransport(None)
-        self.client = Client(wsdl=str(url), wsse=wsse, transport=transport,
-                             settings=Settings(strict=False, xml_huge_tree=True))
+        self.client = CachedClient(WSDLCache.get(url, transport),
+                                   wsse=wsse, transport=transport)
         self.wsClient = self.client.create_service(bindingName, xaddr)
         self.bindingName = bindingName
+        self.namespace = bindingName[bindingName.find('{')+1:bindingName.find('}')]
     
     def createType(self, name):
-        """ create type
+        """ create type, as a copy of a cached prototype
         """
-        bindingName = self.bindingName
-        namespace = bindingName[bindingName.find('{')+1:bindingName.find('}')]
-        client = self.client
-        availableNs = client.namespaces
-        ns = list(availableNs.keys())[list(availableNs.values()).index(namespace)]
-        return client.get_element((ns or 'ns0') + ':' + name)()
+        try:
+            prototype = WSDLCache.prototype(self.url, self.namespace, name)
+        except (KeyError, ZeepLookupError):
+            raise ONVIFError('Unknown type %s in %s' % (name, self.namespace))
+        return clone(prototype)
+    
+    create_type = createType
     
     @staticmethod
     @safeFunc
     def to_dict(zeepobject):
         # Convert a WSDL Type instance into a dictionary
-        return {} if zeepobject is None else zeep.helpers.serialize_object(zeepobject)
+        return {} if zeepobject is None else toDict(zeepobject)
     
     @classmethod
     def service_wrapper(cls, func):
@@ -128,6 +284,51 @@ class ONVIFService:
             return ret
         return wrapped
     
+    @safeFunc
+    def post(self, name, params=None):
+        """ send the request of operation `name` and return the raw HTTP
+        response, without processing the reply
+        """
+        params = {} if params is None else self.to_dict(params)
+        proxy = self.wsClient
+        binding, options = proxy._binding, proxy._binding_options  #pylint: disable=protected-access
+        try:
+            envelope, headers = binding._create(name, (), params,  #pylint: disable=protected-access
+                                                client=self.client, options=options)
+        except TypeError:
+            envelope, headers = binding._create(name, (params,), {},  #pylint: disable=protected-access
+                                                client=self.client, options=options)
+        return self.client.transport.post_xml(options['address'], envelope, headers)
+    
+    async def project(self, name, params, *fields, each=None, asDict=False):
+        """ call operation `name` and extract only `fields` from the response
+        XML, without building zeep objects; see `onvif.projection`
+        """
+        projection = compileProjection(fields, each, asDict)
+        try:
+            response = await self.post(name, params)
+        except ONVIFError:
+            raise
+        except Exception as err:
+            raise ONVIFError(err)
+        if response.status_code != 200 and not response.content:
+            raise ONVIFError('Server returned HTTP status %d' % response.status_code)
+        return projection(response.content)
+    
+    async def raw(self, name, params=None):
+        """ call operation `name` and return its response bytes as a
+        `RawResponse`, without building zeep objects; see `onvif.raw`
+        """
+        try:
+            response = await self.post(name, params)
+        except ONVIFError:
+            raise
+        except Exception as err:
+            raise ONVIFError(err)
+        content = response.content
+        checkFault(content, response.status_code)
+        return RawResponse(self.url, self.bindingName, name, content, response.status_code)
+    
     def __getattr__(self, name):
         """
         Call the real onvif Service operations,
@@ -139,7 +340,12 @@ class ONVIFService:
         if builtin:
             return self.__dict__[name]
         else:
-            return self.service_wrapper(getattr(self.wsClient, name))
+            operation = self.service_wrapper(getattr(self.wsClient, name))
+            operation.project = partial(self.project, name)
+            operation.raw = partial(self.raw, name)
+            # Next lookups find it in the instance dict
+            self.__dict__[name] = operation
+            return operation
 
 
 class ONVIFCamera:
@@ -154,6 +360,11 @@ class ONVIFCamera:
     Also, this cannot be used on AXIS camera, as every request is authenticated,
     contrary to ONVIF standard
 
+    auth parameter selects how requests are authenticated:
+    'wsse' (WS-Security UsernameToken), 'http' (HTTP Digest or Basic, answered
+    pre-emptively once the camera's challenge is known) or 'auto' (both, the
+    scheme accepted by the camera being detected by `update_xaddrs`)
+
     >>> from onvif import ONVIFCamera
     >>> mycam = ONVIFCamera('192.168.0.112', 80, 'admin', '12345')
     >>> mycam.devicemgmt.GetServices(False)
@@ -166,7 +377,10 @@ class ONVIFCamera:
     
     def __init__(self, host, port, user, passwd,
                  wsdlDir: Path=Path(__file__).parent.parent/'wsdl',
-                 encrypt=True, adjust_time=False, transport=None):
+                 encrypt=True, adjust_time=False, transport=None, auth='auto',
+                 compressAbove=None):
+        if auth not in ('wsse', 'http', 'auto'):
+            raise ONVIFError('Unknown authentication scheme %s' % auth)
         environ.pop('http_proxy', None)
         environ.pop('https_proxy', None)
         self.host = host
@@ -176,39 +390,76 @@ class ONVIFCamera:
         self.wsdlDir = wsdlDir
         self.encrypt = encrypt
         self.adjustTime = adjust_time
-        self.transport = transport
         self.xaddrs = { }
-        self.wsse = None
+        self.auth = auth
+        # Authentication scheme accepted by the camera, set by update_xaddrs
+        self.authScheme = None
+        self.httpAuth = HTTPAuth(user, passwd)
+        self.wsse = None if auth == 'http' else \
+            UsernameDigestTokenDtDiff(user, passwd, use_digest=encrypt)
+        # What the camera supports of HTTP compression, and what it saved
+        self.compression = HTTPCompression(compressAbove)
+        # Share the connection pool of the given transport, if any
+        transport = ONVIFTransport.bind(transport, None if auth == 'wsse' else self.httpAuth,
+                                        self.compression)
+        self.transport = transport
         
         # Active service client container
         self.services = {}
         self.servicesLock = RLock()
         
+        # Snapshot URIs per profile token, and the profile used by default
+        self.snapshotUris = {}
+        self.snapshotProfile = None
+        
     
     toDict = ONVIFService.to_dict
     
     async def update_xaddrs(self):
         # Establish devicemgmt service first
         devicemgmt = self.getService('devicemgmt')
-        if self.adjustTime:
-            cdate = await devicemgmt.GetSystemDateAndTime().UTCDateTime
+        if self.adjustTime and self.wsse is not None:
+            cdate = (await devicemgmt.GetSystemDateAndTime()).UTCDateTime
             camDate = datetime(cdate.Date.Year, cdate.Date.Month, cdate.Date.Day,
                                cdate.Time.Hour, cdate.Time.Minute, cdate.Time.Second)
             dtDiff = camDate - datetime.utcnow()
-            self.wsse = UsernameDigestTokenDtDiff(self.user, self.passwd,
-                                                  dt_diff=dtDiff, use_digest=self.encrypt)
-            devicemgmt = self.createService('devicemgmt')
+            self.setWsse(UsernameDigestTokenDtDiff(self.user, self.passwd,
+                                                   dt_diff=dtDiff, use_digest=self.encrypt))
         # Get XAddr of services on the device
         self.xaddrs = {}
-        capabilities = await devicemgmt.GetCapabilities({'Category': 'All'})
-        for name in capabilities:
-            capability = capabilities[name]
+        try:
+            capabilities = await devicemgmt.GetCapabilities({'Category': 'All'})
+        except Exception as err:
+            if self.auth != 'auto' or self.wsse is None or not authFailed(err):
+                raise
+            # Some cameras reject the WS-Security header but accept HTTP authentication
+            logger.info('%s rejected WS-Security, retrying with HTTP authentication',
+                        self.host)
+            wsse = self.wsse
+            self.setWsse(None)
             try:
-                serviceInfo = SERVICES.get(name.lower())
-                if serviceInfo is not None and capability is not None:
-                    self.xaddrs[serviceInfo.ns] = capability['XAddr']
+                capabilities = await devicemgmt.GetCapabilities({'Category': 'All'})
             except Exception:
-                logger.exception('Unexpected service type')
+                self.setWsse(wsse)
+                raise
+        self.authScheme = self.httpAuth.scheme or ('wsse' if self.wsse is not None else None)
+        
+        # Services missing from GetCapabilities, such as media2, are only listed
+        # by GetServices (optional before ONVIF 2.0)
+        namespaces = {serviceInfo.ns for serviceInfo in SERVICES.values()}
+        try:
+            services = await devicemgmt.GetServices.project(
+                {'IncludeCapability': False}, 'Namespace', 'XAddr', each='Service')
+        except Exception:
+            logger.debug('GetServices not supported by %s', self.host)
+        else:
+            for namespace, xaddr in services:
+                if namespace in namespaces and xaddr:
+                    self.xaddrs[namespace] = xaddr
+        for name, xaddr in capabilityXAddrs(capabilities):
+            serviceInfo = SERVICES.get(name.lower())
+            if serviceInfo is not None and xaddr:
+                self.xaddrs[serviceInfo.ns] = xaddr
         
         with self.servicesLock:
             try:
@@ -219,6 +470,32 @@ class ONVIFCamera:
             except Exception:
                 pass
 
+    def supports(self, name):
+        """ whether the device advertised the service `name`
+        """
+        serviceInfo = SERVICES.get(name)
+        if serviceInfo is None:
+            return False
+        ns = serviceInfo.ns
+        if serviceInfo.portType is not None:
+            ns += '/' + serviceInfo.portType
+        return name == 'devicemgmt' or bool(self.xaddrs.get(ns))
+    
+    def getProfiles(self, types=None, token=None):
+        """ media profiles with only the configurations of `types`
+        (e.g. `('VideoSource', 'VideoEncoder')`), through Media2 when the device
+        supports it, see `onvif.profiles`
+        """
+        return getProfiles(self, types, token)
+    
+    def setWsse(self, wsse):
+        """ change the WS-Security token of the camera and of its services
+        """
+        with self.servicesLock:
+            self.wsse = wsse
+            for service in self.services.values():
+                service.client.wsse = wsse
+
     async def update_url(self, host=None, port=None):
         changed = False
         if host and self.host != host:
@@ -239,6 +516,45 @@ class ONVIFCamera:
                 xaddr = getattr(capabilities, sname).XAddr
                 await service.wsClient.set_options(location=xaddr)
     
+    def searchRecordings(self, scope=None, maxMatches=None, **kwargs):
+        """ search session over the recordings of the device (or NVR)
+        
+        :param scope: `SearchScope` restricting the search, e.g.
+        `{'IncludedRecordings': [token1, token2]}`
+        :param kwargs: page size tuning, see `onvif.search.SearchSession`
+        """
+        params = {'Scope': scope or {}}
+        if maxMatches is not None:
+            params['MaxMatches'] = maxMatches
+        return SearchSession(self.getService('search'), 'recordings', params, **kwargs)
+    
+    def searchEvents(self, startPoint, endPoint=None, scope=None, searchFilter=None,
+                     includeStartState=False, maxMatches=None, **kwargs):
+        """ search session over the events of the recordings in `scope`;
+        a start point after the end point searches backwards in time
+        """
+        params = {'StartPoint': startPoint, 'Scope': scope or {},
+                  'SearchFilter': searchFilter or {},
+                  'IncludeStartState': includeStartState}
+        if endPoint is not None:
+            params['EndPoint'] = endPoint
+        if maxMatches is not None:
+            params['MaxMatches'] = maxMatches
+        return SearchSession(self.getService('search'), 'events', params, **kwargs)
+    
+    def checkDrift(self, store, sections=None, camId=None):
+        """ fetch the configuration sections of the device and compare
+        those that changed with their snapshot in `store` (a
+        `SnapshotStore`), see `onvif.drift.sweep`
+        """
+        return sweep(self, store, sections, camId)
+    
+    def snapshot(self, profileToken=None, into=None, limiter=hostLimiter):
+        """ download a JPEG snapshot of a profile (the first one by default),
+        see `onvif.snapshot.fetchSnapshot`
+        """
+        return fetchSnapshot(self, profileToken, into, limiter)
+    
     def getService(self, name, create=True):
         """ get (and maybe created) service from cache
         """
@@ -0,0 +1,234 @@
+""" Fleet-wide configuration push
+
+Each `Setting` reads a configuration with its getter and compares it with
+the wanted values, a partial nested dict. All cameras are read
+concurrently, and only the settings that differ are written back (the
+current configuration updated with the wanted values), then read again to
+verify them. At most `limit` hosts are written at a time, and the settings
+of a host are applied one after the other, in their given order.
+
+>>> settings = [Setting.ntp({'FromDHCP': False,
+...                          'NTPManual': [{'Type': 'IPv4', 'IPv4Address': '10.0.0.1'}]})]
+>>> async for event in pushConfiguration(cameras, settings, limit=32):
+...     print(event.camera.host, event.state, event.diff)
+"""
+import asyncio
+from collections import namedtuple, OrderedDict
+import inspect
+
+from .exceptions import ONVIFError
+from .serialize import toDict
+
+PushEvent = namedtuple('PushEvent', ('camera', 'setting', 'state', 'diff', 'error'))
+PushEvent.__doc__ = """ progress of a setting on a camera; `state` is one of
+'unchanged', 'differs', 'verified', 'mismatch' (still different after being
+written), 'failed' (with `error`) and 'skipped' (after a failure on the same
+host); `diff` maps dotted paths to `(current, wanted)` values """
+
+
+def _same(current, wanted):
+    if current == wanted:
+        return True
+    if isinstance(current, bool) or isinstance(wanted, bool):
+        return str(current).lower() == str(wanted).lower()
+    try:
+        return float(current) == float(wanted)
+    except (TypeError, ValueError):
+        return str(current) == str(wanted)
+
+
+def diff(current, wanted, path=''):
+    """ values of `wanted` that differ in `current`, as a dict mapping
+    dotted paths to `(current, wanted)`
+    """
+    if isinstance(wanted, dict):
+        if not isinstance(current, dict):
+            return {path: (current, wanted)}
+        changes = {}
+        for key, value in wanted.items():
+            changes.update(diff(current.get(key), value, path + '.' + key if path else key))
+        return changes
+    if isinstance(wanted, (list, tuple)):
+        if not isinstance(current, list) or len(current) != len(wanted):
+            return {path: (current, wanted)}
+        changes = {}
+        for index, (currentItem, wantedItem) in enumerate(zip(current, wanted)):
+            changes.update(diff(currentItem, wantedItem, '%s.%d' % (path, index)))
+        return changes
+    return {} if _same(current, wanted) else {path: (current, wanted)}
+
+
+def merge(current, wanted):
+    """ copy of `current` updated with `wanted`; lists are replaced
+    """
+    if not isinstance(wanted, dict) or not isinstance(current, dict):
+        return wanted
+    merged = dict(current)
+    for key, value in wanted.items():
+        merged[key] = merge(current.get(key), value)
+    return merged
+
+
+class Setting:
+    """
+    A configuration to enforce.
+
+    :param service: name of the service (see `SERVICES`)
+    :param getter: operation reading the configuration
+    :param setter: operation writing it
+    :param wanted: wanted values, a partial nested dict
+    :param getParams: parameters of the getter
+    :param wrap: name of the setter parameter holding the configuration,
+    None if the configuration fields are the parameters
+    :param fields: configuration fields accepted by the setter (all if None)
+    :param extra: other parameters of the setter
+    """
+    def __init__(self, service, getter, setter, wanted, getParams=None, wrap=None,
+                 fields=None, extra=None):
+        self.service = service
+        self.getter = getter
+        self.setter = setter
+        self.wanted = wanted
+        self.getParams = getParams
+        self.wrap = wrap
+        self.fields = fields
+        self.extra = extra
+
+    @classmethod
+    def videoEncoder(cls, token, wanted):
+        """ media video encoder configuration `token` """
+        return cls('media', 'GetVideoEncoderConfiguration', 'SetVideoEncoderConfiguration',
+                   wanted, {'ConfigurationToken': token}, wrap='Configuration',
+                   extra={'ForcePersistence': True})
+
+    @classmethod
+    def ntp(cls, wanted):
+        return cls('devicemgmt', 'GetNTP', 'SetNTP', wanted,
+                   fields=('FromDHCP', 'NTPManual'))
+
+    @classmethod
+    def dns(cls, wanted):
+        return cls('devicemgmt', 'GetDNS', 'SetDNS', wanted,
+                   fields=('FromDHCP', 'SearchDomain', 'DNSManual'))
+
+    def __repr__(self):
+        return '<Setting %s.%s %r>' % (self.service, self.setter, self.getParams or '')
+
+    async def read(self, camera):
+        service = camera.getService(self.service)
+        return toDict(await getattr(service, self.getter)(self.getParams))
+
+    def diff(self, current):
+        return diff(current, self.wanted)
+
+    def request(self, current):
+        """ setter parameters writing `current` updated with the wanted values """
+        config = merge(current, self.wanted)
+        if self.fields is not None:
+            config = {key: config.get(key) for key in self.fields}
+        params = {self.wrap: config} if self.wrap else config
+        params.update(self.extra or ())
+        return params
+
+    async def write(self, camera, current):
+        service = camera.getService(self.service)
+        await getattr(service, self.setter)(self.request(current))
+
+
+def _error(err):
+    # Awaited operations raise zeep, aiohttp or timeout errors as they are
+    return err if isinstance(err, ONVIFError) else ONVIFError(err)
+
+
+async def _settingsOf(camera, settings):
+    found = settings(camera) if callable(settings) else settings
+    if inspect.isawaitable(found):
+        found = await found
+    return list(found)
+
+
+async def pushConfiguration(cameras, settings, limit=32, readLimit=256, dryRun=False,
+                            stopOnError=True):
+    """
+    Apply `settings` to `cameras` and yield `PushEvent`s as they happen.
+
+    :param settings: list of `Setting`s, or a callable returning the
+    settings of a camera (possibly a coroutine function)
+    :param limit: number of hosts being written at the same time
+    :param readLimit: number of hosts being read at the same time
+    :param dryRun: only read and compare
+    :param stopOnError: skip the next settings of a host after a failure
+    """
+    readSemaphore = asyncio.Semaphore(readLimit)
+    pushSemaphore = asyncio.Semaphore(limit)
+    events = asyncio.Queue()
+    hosts = OrderedDict()
+    for camera in cameras:
+        hosts.setdefault(camera.host, []).append(camera)
+
+    def report(*event):
+        events.put_nowait(PushEvent(*event))
+
+    async def rollout(hostCameras):
+        plan = []
+        async with readSemaphore:
+            for camera in hostCameras:
+                try:
+                    cameraSettings = await _settingsOf(camera, settings)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as err:
+                    report(camera, None, 'failed', None, _error(err))
+                    continue
+                for setting in cameraSettings:
+                    try:
+                        current = await setting.read(camera)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as err:
+                        report(camera, setting, 'failed', None, _error(err))
+                        continue
+                    changes = setting.diff(current)
+                    report(camera, setting, 'differs' if changes else 'unchanged', changes, None)
+                    if changes:
+                        plan.append((camera, setting, current))
+        if dryRun or not plan:
+            return
+        async with pushSemaphore:
+            failed = False
+            for camera, setting, current in plan:
+                if failed:
+                    report(camera, setting, 'skipped', None, None)
+                    continue
+                try:
+                    await setting.write(camera, current)
+                    changes = setting.diff(await setting.read(camera))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as err:
+                    report(camera, setting, 'failed', None, _error(err))
+                    failed = stopOnError
+                    continue
+                report(camera, setting, 'mismatch' if changes else 'verified', changes, None)
+
+    async def run(hostCameras):
+        try:
+            await rollout(hostCameras)
+        finally:
+            events.put_nowait(None)
+
+    tasks = [asyncio.ensure_future(run(hostCameras)) for hostCameras in hosts.values()]
+    try:
+        running = len(tasks)
+        while running:
+            event = await events.get()
+            if event is None:
+                running -= 1
+            else:
+                yield event
+        for task in tasks:
+            # re-raise unexpected errors
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
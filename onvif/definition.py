@@ -8,6 +8,8 @@ SI = namedtuple('ServiceInfo', ('ns', 'wsdl', 'binding', 'portType'))
 SERVICES = {
     'devicemgmt'   : SI(NS+'ver10/device/wsdl', 'devicemgmt.wsdl', 'DeviceBinding', None),
     'media'        : SI(NS+'ver10/media/wsdl',     'media.wsdl', 'MediaBinding', None),
+    'media2'       : SI(NS+'ver20/media/wsdl', 'ver20/media/wsdl/media.wsdl',
+                        'Media2Binding', None),
     'ptz'          : SI(NS+'ver20/ptz/wsdl',       'ptz.wsdl',   'PTZBinding', None),
     'imaging'      : SI(NS+'ver20/imaging/wsdl', 'imaging.wsdl', 'ImagingBinding', None),
     'deviceio'     : SI(NS+'ver10/deviceIO/wsdl', 'deviceio.wsdl',
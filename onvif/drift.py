@@ -0,0 +1,209 @@
+""" Configuration drift detection
+
+A sweep fetches each configuration section of a camera as raw XML and
+hashes a canonical form of it (namespace prefixes and indentation don't
+matter). Only the sections whose hash differs from the stored snapshot are
+deserialized and compared with their previous content; the snapshots are
+kept in a SQLite database.
+
+>>> store = SnapshotStore('/var/lib/onvif/config.db')
+>>> result = await mycam.checkDrift(store)
+>>> for section, changes in result.changed.items():
+...     print(section, changes)     # None for a new section
+>>> async for camera, result in sweepFleet(cameras, store, limit=64):
+...     print(camera.host, result)    # an ONVIFError if the sweep failed
+"""
+import asyncio
+from collections import namedtuple
+import hashlib
+import json
+import sqlite3
+from time import time
+
+from lxml import etree
+
+from .exceptions import ONVIFError
+from .serialize import toJson
+
+Section = namedtuple('Section', ('name', 'service', 'operation', 'params'))
+Section.__doc__ = """ a configuration section: the response of `service.operation(params)` """
+
+SweepResult = namedtuple('SweepResult', ('changed', 'unchanged', 'removed', 'errors'))
+SweepResult.__doc__ = """ `changed` maps the changed sections to their changes (see `deepDiff`),
+None for sections without previous snapshot; `unchanged` lists the other
+sections, `removed` the sections of the snapshot the camera no longer has,
+and `errors` maps the sections that couldn't be fetched or parsed to their error """
+
+
+async def imagingSections(camera):
+    """ imaging settings of every video source """
+    tokens = await camera.getService('media').GetVideoSources.project(
+        None, 'token', each='VideoSources')
+    return [Section('imaging/%s' % token, 'imaging', 'GetImagingSettings',
+                    {'VideoSourceToken': token}) for token, in tokens]
+
+
+DEFAULT_SECTIONS = (
+    Section('profiles', 'media', 'GetProfiles', None),
+    Section('networkInterfaces', 'devicemgmt', 'GetNetworkInterfaces', None),
+    Section('videoEncoders', 'media', 'GetVideoEncoderConfigurations', None),
+    imagingSections,
+)
+
+
+def canonicalHash(element):
+    """ hash of an element tree, independent of namespace prefixes, attribute
+    order and whitespace around values
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    update = digest.update
+    for event, node in etree.iterwalk(element, events=('start', 'end')):
+        if not isinstance(node.tag, str):
+            # comment or processing instruction
+            continue
+        if event == 'end':
+            update(b'\x01')
+            continue
+        update(b'\x02' + node.tag.encode())
+        for key, value in sorted(node.attrib.items()):
+            update(b'\x03' + key.encode() + b'=' + value.encode())
+        text = (node.text or '').strip()
+        if text:
+            update(b'\x04' + text.encode())
+    return digest.hexdigest()
+
+
+def deepDiff(old, new, path=''):
+    """ `{path: (oldValue, newValue)}` of the differences between two plain
+    objects, paths being dotted keys and list indexes
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = {}
+        for key in old.keys() | new.keys():
+            changes.update(deepDiff(old.get(key), new.get(key),
+                                    path + '.' + key if path else key))
+        return changes
+    if isinstance(old, list) and isinstance(new, list):
+        changes = {}
+        for index in range(max(len(old), len(new))):
+            changes.update(deepDiff(old[index] if index < len(old) else None,
+                                    new[index] if index < len(new) else None,
+                                    '%s.%d' % (path, index) if path else str(index)))
+        return changes
+    return {} if old == new else {path: (old, new)}
+
+
+class SnapshotStore:
+    """ configuration snapshots (hash and content of each section) in a
+    SQLite database
+    """
+    def __init__(self, path=':memory:'):
+        self.db = sqlite3.connect(str(path))
+        self.db.execute('CREATE TABLE IF NOT EXISTS sections ('
+                        'camera TEXT, section TEXT, hash TEXT, time REAL, data TEXT, '
+                        'PRIMARY KEY (camera, section))')
+
+    def hashes(self, camera):
+        """ `{section: hash}` of a camera """
+        return dict(self.db.execute('SELECT section, hash FROM sections WHERE camera = ?',
+                                    (camera,)))
+
+    def get(self, camera, section):
+        """ `(hash, time, content)` of a section, None if unknown """
+        row = self.db.execute('SELECT hash, time, data FROM sections '
+                              'WHERE camera = ? AND section = ?', (camera, section)).fetchone()
+        return None if row is None else (row[0], row[1], json.loads(row[2]))
+
+    def put(self, camera, section, hashValue, data):
+        """ store the content of a section, `data` being JSON """
+        self.db.execute('INSERT OR REPLACE INTO sections VALUES (?, ?, ?, ?, ?)',
+                        (camera, section, hashValue, time(), data))
+
+    def remove(self, camera, sections):
+        self.db.executemany('DELETE FROM sections WHERE camera = ? AND section = ?',
+                            [(camera, section) for section in sections])
+
+    def touch(self, camera, sections):
+        self.db.executemany('UPDATE sections SET time = ? WHERE camera = ? AND section = ?',
+                            [(time(), camera, section) for section in sections])
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+async def _expand(camera, sections, errors):
+    expanded = []
+    for section in sections:
+        if isinstance(section, Section):
+            expanded.append(section)
+            continue
+        try:
+            expanded += await section(camera)
+        except Exception as err:
+            errors[getattr(section, '__name__', str(section))] = \
+                err if isinstance(err, ONVIFError) else ONVIFError(err)
+    return expanded
+
+
+async def sweep(camera, store, sections=None, camId=None):
+    """
+    Fetch the configuration `sections` of `camera` (`DEFAULT_SECTIONS` by
+    default; items may also be coroutine functions returning sections of a
+    camera) and update its snapshot in `store`, keyed by `camId`
+    ("host:port" by default). Returns a `SweepResult`.
+    """
+    camId = '%s:%d' % (camera.host, camera.port) if camId is None else camId
+    changed, unchanged, errors = {}, [], {}
+    hashes = store.hashes(camId)
+    expanded = await _expand(camera, sections or DEFAULT_SECTIONS, errors)
+    for section in expanded:
+        try:
+            service = camera.getService(section.service)
+            raw = await service.raw(section.operation, section.params)
+            hashValue = canonicalHash(raw.element())
+            if hashes.get(section.name) == hashValue:
+                unchanged.append(section.name)
+                continue
+            # Only changed sections are deserialized
+            data = toJson(raw.parse()).decode()
+            previous = store.get(camId, section.name)
+            changes = None if previous is None else deepDiff(previous[2], json.loads(data))
+        except Exception as err:
+            errors[section.name] = err if isinstance(err, ONVIFError) else ONVIFError(err)
+            continue
+        changed[section.name] = changes
+        store.put(camId, section.name, hashValue, data)
+    # Sections can only be known to be gone when all of them were listed
+    removed = [] if errors.keys() - {section.name for section in expanded} else \
+        sorted(hashes.keys() - {section.name for section in expanded})
+    store.remove(camId, removed)
+    store.touch(camId, unchanged)
+    store.commit()
+    return SweepResult(changed, unchanged, removed, errors)
+
+
+async def sweepFleet(cameras, store, sections=None, limit=64):
+    """ sweep `cameras`, at most `limit` at a time, and yield `(camera,
+    SweepResult)` pairs as they complete (`(camera, ONVIFError)` on failure)
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(camera):
+        async with semaphore:
+            try:
+                return camera, await sweep(camera, store, sections)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                return camera, err if isinstance(err, ONVIFError) else ONVIFError(err)
+
+    tasks = [asyncio.ensure_future(run(camera)) for camera in cameras]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,246 @@
+""" Live state of event properties
+
+Property events (those with a `PropertyOperation`) describe a state, such as
+motion-active, input-closed or tamper, rather than a moment. The table keeps
+the last data of every property, keyed by camera, topic and source, from the
+cameras' pull point subscriptions.
+
+Each new subscription starts with an `Initialized` message for every
+property of the camera: properties not part of that burst no longer exist
+and are removed when it ends, which reconciles the table after a
+resubscription.
+
+>>> table = EventStateTable()
+>>> task = asyncio.ensure_future(table.follow(mycam, 'cam1'))
+>>> table.get('cam1', 'tns1:RuleEngine/CellMotionDetector/Motion',
+...           {'VideoSourceConfigurationToken': 'vs0', 'Rule': 'MyMotion'})
+{'IsMotion': 'true'}
+>>> before = table.snapshot('cam1')
+>>> EventStateTable.diff(before, table.snapshot('cam1'))
+"""
+import asyncio
+from collections import namedtuple, defaultdict
+import logging
+from time import monotonic
+
+from lxml import etree
+
+from .definition import SERVICES
+from .exceptions import ONVIFError
+from .projection import responseElement
+
+logger = logging.getLogger('onvif')
+
+TOPICS_NS = 'http://www.onvif.org/ver10/topics'
+
+EventMessage = namedtuple('EventMessage', ('topic', 'source', 'data', 'operation', 'utcTime'))
+EventMessage.__doc__ = """ a notification; `source` is a sorted tuple of `(name, value)`
+pairs, `data` a dict of simple item values (element items as XML strings),
+`operation` the PropertyOperation or None for other events """
+
+PropertyState = namedtuple('PropertyState', ('data', 'utcTime', 'version'))
+
+
+def _topic(element):
+    """ topic path, with the ONVIF topic namespace always prefixed by tns1 """
+    text = (element.text or '').strip()
+    prefix, sep, path = text.partition(':')
+    if sep and element.nsmap.get(prefix) == TOPICS_NS:
+        return 'tns1:' + path
+    return text
+
+
+def _items(parent):
+    if parent is None:
+        return {}
+    items = {item.get('Name'): item.get('Value') for item in parent.iterfind('{*}SimpleItem')}
+    for item in parent.iterfind('{*}ElementItem'):
+        items[item.get('Name')] = ''.join(etree.tostring(child, encoding=str) for child in item)
+    return items
+
+
+def parseNotifications(response):
+    """ `EventMessage`s of a PullMessagesResponse element """
+    for notification in response.iterfind('{*}NotificationMessage'):
+        topic = notification.find('{*}Topic')
+        message = notification.find('{*}Message/{*}Message')
+        if topic is None or message is None:
+            continue
+        source = _items(message.find('{*}Source'))
+        yield EventMessage(_topic(topic), tuple(sorted(source.items())),
+                           _items(message.find('{*}Data')),
+                           message.get('PropertyOperation'), message.get('UtcTime'))
+
+
+def sourceKey(source):
+    """ hashable key of a source given as a dict or as `(name, value)` pairs """
+    return tuple(sorted(source.items() if isinstance(source, dict) else source))
+
+
+def _bind(camera, name, address, events):
+    """ service `name` of the subscription at `address` """
+    from .client import ONVIFService
+    ns, wsdl, binding, _ = SERVICES[name]
+    return ONVIFService(address, camera.wsse, camera.wsdlDir / wsdl,
+                        bindingName='{%s}%s' % (ns, binding),
+                        transport=events.client.transport)
+
+
+async def _unsubscribe(camera, manager, timeout):
+    """ release a subscription, so that cameras with few subscription slots
+    don't run out of them
+    """
+    try:
+        await asyncio.wait_for(manager.Unsubscribe(), timeout)
+    except Exception as err:
+        logger.debug('Unsubscribe failed on %s: %s', camera.host, err)
+
+
+class EventStateTable:
+    """
+    Current data of the event properties of cameras, keyed by
+    `(camera, topic, source)`; `camera` is any hashable identifier.
+    """
+    def __init__(self):
+        self.states = {}                 # (camera, topic, source) -> PropertyState
+        self.cameras = defaultdict(set)  # camera -> keys
+        self.syncing = {}                # camera -> keys not confirmed by the Initialized burst
+        self.version = 0
+
+    def __len__(self):
+        return len(self.states)
+
+    def get(self, camera, topic, source=()):
+        """ data of a property, None if unknown """
+        state = self.states.get((camera, topic, sourceKey(source)))
+        return None if state is None else state.data
+
+    def state(self, camera, topic, source=()):
+        return self.states.get((camera, topic, sourceKey(source)))
+
+    def apply(self, camera, message):
+        """ update the table with an `EventMessage`; returns True if it changed
+        """
+        if message.operation is None:
+            return False
+        key = (camera, message.topic, message.source)
+        if message.operation == 'Deleted':
+            return self.remove(key)
+        syncing = self.syncing.get(camera)
+        if syncing is not None:
+            syncing.discard(key)
+        current = self.states.get(key)
+        if current is not None and current.data == message.data:
+            return False
+        self.version += 1
+        self.states[key] = PropertyState(message.data, message.utcTime, self.version)
+        self.cameras[camera].add(key)
+        return True
+
+    def remove(self, key):
+        if self.states.pop(key, None) is None:
+            return False
+        self.version += 1
+        keys = self.cameras[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.cameras[key[0]]
+        return True
+
+    def clear(self, camera):
+        """ forget the properties of `camera` """
+        for key in list(self.cameras.get(camera, ())):
+            self.remove(key)
+        self.syncing.pop(camera, None)
+
+    def beginSync(self, camera):
+        """ a new subscription of `camera` starts: its Initialized burst follows """
+        self.syncing[camera] = set(self.cameras.get(camera, ()))
+
+    def endSync(self, camera):
+        """ the Initialized burst is over: remove the properties it didn't
+        mention; returns their number
+        """
+        stale = self.syncing.pop(camera, ())
+        for key in stale:
+            self.remove(key)
+        return len(stale)
+
+    def snapshot(self, camera=None, topic=None):
+        """ copy of the `{key: PropertyState}` table, optionally restricted to
+        a camera and/or a topic
+        """
+        if camera is None:
+            items = self.states.items()
+        else:
+            items = ((key, self.states[key]) for key in self.cameras.get(camera, ()))
+        return {key: state for key, state in items if topic is None or key[1] == topic}
+
+    @staticmethod
+    def diff(before, after):
+        """ `{key: (oldData, newData)}` of the properties that changed between
+        two snapshots, None standing for a missing property
+        """
+        changes = {}
+        for key, state in after.items():
+            old = before.get(key)
+            if old is None or old.data != state.data:
+                changes[key] = (None if old is None else old.data, state.data)
+        for key, state in before.items():
+            if key not in after:
+                changes[key] = (state.data, None)
+        return changes
+
+    async def follow(self, camera, camId=None, timeout=10, limit=100, lifetime=60,
+                     retryDelay=5):
+        """
+        Keep the properties of `camera` up to date from a pull point
+        subscription, resubscribing when it fails; runs until cancelled.
+
+        :param camId: key of the camera in the table (the camera itself by default)
+        :param timeout: PullMessages timeout, in seconds
+        :param lifetime: subscription termination time, in seconds; the
+        subscription is renewed every `lifetime / 2` seconds
+        """
+        camId = camera if camId is None else camId
+        events = camera.getService('events')
+        while True:
+            manager = None
+            try:
+                address, = await events.CreatePullPointSubscription.project(
+                    {'InitialTerminationTime': 'PT%gS' % lifetime}, 'SubscriptionReference.Address')
+                if not address:
+                    raise ONVIFError('No pull point address')
+                manager = _bind(camera, 'subscription', address, events)
+                pullpoint = _bind(camera, 'pullpoint', address, events)
+                self.beginSync(camId)
+                renewed = monotonic()
+                while True:
+                    response = await pullpoint.post('PullMessages', {'Timeout': 'PT%gS' % timeout,
+                                                                     'MessageLimit': limit})
+                    if response.status_code != 200 and not response.content:
+                        raise ONVIFError('Server returned HTTP status %d' % response.status_code)
+                    initialized = False
+                    for message in parseNotifications(responseElement(response.content)):
+                        initialized |= message.operation == 'Initialized'
+                        self.apply(camId, message)
+                    if not initialized and camId in self.syncing:
+                        self.endSync(camId)
+                    if monotonic() - renewed > lifetime / 2:
+                        try:
+                            await manager.Renew({'TerminationTime': 'PT%gS' % lifetime})
+                        except asyncio.CancelledError:
+                            raise
+                        except Exception as err:
+                            # The pull point may still be alive: PullMessages tells
+                            logger.debug('Renew failed on %s: %s', camera.host, err)
+                        renewed = monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.warning('Event subscription of %s failed (%s), resubscribing',
+                               camera.host, err)
+            finally:
+                if manager is not None:
+                    await _unsubscribe(camera, manager, timeout)
+            await asyncio.sleep(retryDelay)
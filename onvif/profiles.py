@@ -0,0 +1,83 @@
+""" Media profiles, through Media2 when available
+
+Media2 `GetProfiles` only returns the configurations of the requested
+`Type`s, which keeps responses small on multi-channel encoders. Devices
+without Media2 fall back to Media1, whose profiles always carry every
+configuration; those are filtered to the same shape.
+
+>>> for profile in await mycam.getProfiles(('VideoEncoder',)):
+...     print(profile.token, profile.configurations['VideoEncoder'].Encoding)
+"""
+from collections import namedtuple
+import logging
+
+logger = logging.getLogger('onvif')
+
+MediaProfile = namedtuple('MediaProfile', ('token', 'name', 'fixed', 'configurations'))
+MediaProfile.__doc__ = """ profile of either media service; `configurations` maps
+configuration types ('VideoSource', 'VideoEncoder', ...) to configurations """
+
+# Media2 configuration type -> Media1 profile field
+MEDIA1_CONFIGURATIONS = {
+    'VideoSource'  : 'VideoSourceConfiguration',
+    'AudioSource'  : 'AudioSourceConfiguration',
+    'VideoEncoder' : 'VideoEncoderConfiguration',
+    'AudioEncoder' : 'AudioEncoderConfiguration',
+    'Analytics'    : 'VideoAnalyticsConfiguration',
+    'PTZ'          : 'PTZConfiguration',
+    'Metadata'     : 'MetadataConfiguration',
+}
+# Media1 configurations found in the profile's Extension
+MEDIA1_EXTENSION_CONFIGURATIONS = {
+    'AudioOutput'  : 'AudioOutputConfiguration',
+    'AudioDecoder' : 'AudioDecoderConfiguration',
+}
+
+
+def _media2Profile(profile):
+    configurations = {}
+    if profile.Configurations is not None:
+        for kind in profile.Configurations:
+            configuration = profile.Configurations[kind]
+            if configuration is not None and not kind.startswith('_'):
+                configurations[kind] = configuration
+    return MediaProfile(profile.token, profile.Name, profile.fixed, configurations)
+
+
+def _media1Profile(profile, types):
+    configurations = {}
+    for kind, field in MEDIA1_CONFIGURATIONS.items():
+        configuration = getattr(profile, field, None)
+        if configuration is not None and (types is None or kind in types):
+            configurations[kind] = configuration
+    extension = getattr(profile, 'Extension', None)
+    if extension is not None:
+        for kind, field in MEDIA1_EXTENSION_CONFIGURATIONS.items():
+            configuration = getattr(extension, field, None)
+            if configuration is not None and (types is None or kind in types):
+                configurations[kind] = configuration
+    return MediaProfile(profile.token, profile.Name, profile.fixed, configurations)
+
+
+async def getProfiles(camera, types=None, token=None):
+    """
+    Get the media profiles of `camera` with only the configurations of
+    `types` (all of them if None), as `MediaProfile`s.
+    """
+    types = None if types is None or 'All' in types else frozenset(types)
+    if camera.supports('media2'):
+        params = {'Type': sorted(types) if types else ['All']}
+        if token is not None:
+            params['Token'] = token
+        try:
+            profiles = await camera.getService('media2').GetProfiles(params)
+            return [_media2Profile(profile) for profile in profiles or ()]
+        except Exception:
+            logger.warning('Media2 GetProfiles failed on %s, falling back to Media1',
+                           camera.host, exc_info=True)
+    media = camera.getService('media')
+    if token is not None:
+        profiles = [await media.GetProfile({'ProfileToken': token})]
+    else:
+        profiles = await media.GetProfiles()
+    return [_media1Profile(profile, types) for profile in profiles or ()]
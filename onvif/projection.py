@@ -0,0 +1,114 @@
+""" Field projection on raw SOAP responses
+
+A projection extracts a few values from the response XML with lxml, without
+building the zeep objects of the whole response.
+Field paths are dotted element names relative to the object zeep would
+return, the last name of a path may also be an attribute:
+
+>>> await ptz.GetStatus.project({'ProfileToken': token},
+...                             ('Position.PanTilt.x', float), ('Position.PanTilt.y', float))
+(0.5, -0.25)
+>>> await media.GetProfiles.project(None, 'token', 'Name', each='Profiles')
+[('main', 'MainStream'), ('sub', 'SubStream')]
+"""
+from functools import lru_cache
+
+from lxml import etree
+
+from .exceptions import ONVIFError
+
+PARSER = etree.XMLParser(resolve_entities=False, huge_tree=True, no_network=True)
+
+
+def _elementPath(names):
+    return '/'.join('{*}' + name for name in names)
+
+
+class Field:
+    """ a single compiled field path
+    """
+    __slots__ = ('name', 'path', 'parentPath', 'attribute', 'convert')
+
+    def __init__(self, path, convert=None):
+        names = path.split('.')
+        self.name = path
+        self.path = _elementPath(names)
+        self.parentPath = _elementPath(names[:-1])
+        self.attribute = names[-1]
+        self.convert = convert
+
+    def get(self, node):
+        child = node.find(self.path)
+        if child is not None:
+            value = child.text
+        else:
+            parent = node.find(self.parentPath) if self.parentPath else node
+            value = None if parent is None else parent.get(self.attribute)
+        if value is not None and self.convert is not None:
+            value = self.convert(value)
+        return value
+
+
+class Projection:
+    """
+    Compiled projection: `fields` are paths, or `(path, converter)` pairs.
+    The result is a tuple (or a dict keyed by path if `asDict` is set);
+    with `each`, the fields are read relative to every element matching
+    that path and a list of tuples (or dicts) is returned.
+    """
+    def __init__(self, fields, each=None, asDict=False):
+        self.fields = [Field(*field) if isinstance(field, tuple) else Field(field)
+                       for field in fields]
+        self.each = _elementPath(each.split('.')) if each else None
+        self.asDict = asDict
+        first = each or (fields[0][0] if isinstance(fields[0], tuple) else fields[0])
+        self.first = first.split('.')[0]
+
+    def row(self, node):
+        if self.asDict:
+            return {field.name: field.get(node) for field in self.fields}
+        return tuple(field.get(node) for field in self.fields)
+
+    def __call__(self, content):
+        base = responseElement(content)
+        # zeep unwraps responses with a single child, so do the same
+        if len(base) == 1 and etree.QName(base[0]).localname != self.first:
+            base = base[0]
+        if self.each is None:
+            return self.row(base)
+        return [self.row(node) for node in base.iterfind(self.each)]
+
+
+@lru_cache(maxsize=256)
+def compile(fields, each=None, asDict=False):  #pylint: disable=redefined-builtin
+    """ get (and maybe compile) projection from cache
+    """
+    if not fields:
+        raise ONVIFError('No field to project')
+    return Projection(fields, each, asDict)
+
+
+def responseElement(content):
+    """ parse a SOAP response and return the first element of its body,
+    raising ONVIFError on SOAP faults
+    """
+    try:
+        root = etree.fromstring(content, PARSER)
+    except etree.XMLSyntaxError as err:
+        raise ONVIFError(err)
+    body = root.find('{*}Body')
+    if body is None or not len(body):
+        raise ONVIFError('Empty SOAP response')
+    response = body[0]
+    if etree.QName(response).localname == 'Fault':
+        raise ONVIFError(faultReason(response))
+    return response
+
+
+def faultReason(fault):
+    """ reason of a SOAP 1.1 or 1.2 fault element
+    """
+    reason = fault.findtext('{*}Reason/{*}Text') or fault.findtext('faultstring')
+    code = fault.findtext('{*}Code/{*}Subcode/{*}Value') or \
+           fault.findtext('{*}Code/{*}Value') or fault.findtext('faultcode')
+    return 'SOAP fault %s: %s' % (code, reason)
@@ -0,0 +1,100 @@
+""" Raw responses, deserialized later
+
+`service.Operation.raw(params)` returns the response bytes as received,
+after a cheap check for SOAP faults: only the start of the body is looked
+at, nothing is parsed unless a fault is found. The bytes can be archived and
+deserialized later, possibly in another process, against the cached WSDL.
+
+>>> raw = await devicemgmt.GetDeviceInformation.raw()
+>>> archive.write(raw.content)
+>>> info = raw.parse()
+>>> info = deserialize(content, 'GetDeviceInformation', raw.wsdl, raw.binding)
+"""
+from functools import lru_cache
+from pathlib import Path
+import re
+
+from lxml import etree
+
+from .exceptions import ONVIFError
+from .projection import PARSER, responseElement
+
+# First element of the SOAP body, when it is a fault
+FAULT = re.compile(rb'<(?:[\w.-]+:)?Body[^>]*>\s*<(?:[\w.-]+:)?Fault[\s>/]')
+
+
+def checkFault(content, status=200):
+    """ raise ONVIFError if `content` is a SOAP fault (or not a SOAP
+    response at all, for error statuses)
+    """
+    if FAULT.search(content):
+        responseElement(content)
+        raise ONVIFError('SOAP fault')
+    if status != 200 and b'Envelope' not in content[:1024]:
+        raise ONVIFError('Server returned HTTP status %d' % status)
+
+
+class RawResponse:
+    """ raw response of `operation` of the service bound by `binding` in `wsdl`
+    """
+    __slots__ = ('wsdl', 'binding', 'operation', 'content', 'status')
+
+    def __init__(self, wsdl, binding, operation, content, status=200):
+        self.wsdl = wsdl
+        self.binding = binding
+        self.operation = operation
+        self.content = content
+        self.status = status
+
+    def __len__(self):
+        return len(self.content)
+
+    def __bytes__(self):
+        return self.content
+
+    def __repr__(self):
+        return '<RawResponse %s %d bytes>' % (self.operation, len(self.content))
+
+    def element(self):
+        """ first element of the body, as lxml element """
+        return responseElement(self.content)
+
+    def parse(self):
+        """ zeep objects, as returned by the operation """
+        return deserialize(self.content, self.operation, self.wsdl, self.binding)
+
+
+@lru_cache(maxsize=None)
+def _operation(wsdl, binding, operation):
+    from zeep.transports import Transport
+    from .client import WSDLCache
+    # Replies are processed the same way by sync and async bindings, so reuse
+    # the document of the services if there is one
+    document = WSDLCache.parsed(Path(wsdl))
+    if document is None:
+        # Local WSDL files don't need a network transport, but zeep requires one
+        document = WSDLCache.get(Path(wsdl), Transport())
+    try:
+        return document.bindings[binding].get(operation)
+    except (KeyError, ValueError) as err:
+        raise ONVIFError('Unknown operation %s of %s: %s' % (operation, binding, err))
+
+
+def deserialize(content, operation, wsdl, binding):
+    """
+    Deserialize a raw response of `operation`, `wsdl` being the path of the
+    WSDL file and `binding` the qualified binding name (see
+    `ONVIFService.url` and `ONVIFService.bindingName`).
+    """
+    op = _operation(str(wsdl), binding, operation)
+    try:
+        envelope = etree.fromstring(content, PARSER)
+    except etree.XMLSyntaxError as err:
+        raise ONVIFError(err)
+    body = envelope.find('{*}Body')
+    if body is not None and len(body) and etree.QName(body[0]).localname == 'Fault':
+        responseElement(content)
+    try:
+        return op.process_reply(envelope)
+    except Exception as err:
+        raise ONVIFError(err)
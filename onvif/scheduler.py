@@ -0,0 +1,240 @@
+""" Periodic polling of camera operations
+
+All jobs run on a small fixed set of worker tasks. Due times are kept in a
+heap, jittered so that jobs added together drift apart, and requests to the
+same host are spaced by at least `hostSpacing` seconds. Slow or failing
+cameras are polled less often until they recover.
+
+>>> scheduler = PollScheduler(workers=16)
+>>> scheduler.add(mycam, 'ptz', 'GetStatus', {'ProfileToken': token},
+...               interval=1, priority=1, callback=onStatus)
+>>> scheduler.add(mycam, 'devicemgmt', 'GetSystemDateAndTime', interval=60)
+>>> async with scheduler:
+...     await asyncio.sleep(3600)
+>>> scheduler.metrics()
+"""
+import asyncio
+import heapq
+import inspect
+import logging
+import random
+from itertools import count
+from time import monotonic
+
+logger = logging.getLogger('onvif')
+
+
+class PollJob:
+    """ a periodic call of `service.operation(params)` on a camera
+    """
+    __slots__ = ('camera', 'service', 'operation', 'params', 'interval', 'priority',
+                 'callback', 'active', 'backoff', 'due', 'runs', 'failures', 'duration')
+
+    def __init__(self, camera, service, operation, params, interval, priority, callback):
+        self.camera = camera
+        self.service = service
+        self.operation = operation
+        self.params = params
+        self.interval = interval
+        self.priority = priority
+        self.callback = callback
+        self.active = True
+        self.backoff = 1.0     # interval multiplier, > 1 for slow or failing cameras
+        self.due = None
+        self.runs = 0
+        self.failures = 0      # consecutive failures
+        self.duration = None   # duration of the last call, in seconds
+
+    @property
+    def host(self):
+        return self.camera.host
+
+    def __repr__(self):
+        return '<PollJob %s %s.%s every %ss>' % (self.host, self.service,
+                                                 self.operation, self.interval)
+
+
+class LagStats:
+    """ schedule lag: delay between the due time of a job and its start
+    """
+    __slots__ = ('count', 'total', 'max', 'last', 'ewma')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.ewma = 0.0
+
+    def add(self, lag, alpha=0.05):
+        self.count += 1
+        self.total += lag
+        self.last = lag
+        self.max = max(self.max, lag)
+        self.ewma += alpha * (lag - self.ewma)
+
+    def asDict(self):
+        return {'count': self.count, 'mean': self.total / self.count if self.count else 0.0,
+                'max': self.max, 'last': self.last, 'ewma': self.ewma}
+
+
+class PollScheduler:
+    """
+    :param workers: number of tasks running the calls
+    :param jitter: relative random variation of the intervals
+    :param hostSpacing: minimum delay between two calls to the same host, in seconds
+    :param slowRatio: a call lasting more than this ratio of its interval
+    slows the job down
+    :param maxBackoff: maximum interval multiplier of slow or failing jobs
+    """
+    def __init__(self, workers=8, jitter=0.1, hostSpacing=0.05, slowRatio=0.5,
+                 maxBackoff=32):
+        self.workers = workers
+        self.jitter = jitter
+        self.hostSpacing = hostSpacing
+        self.slowRatio = slowRatio
+        self.maxBackoff = maxBackoff
+        self.jobs = set()
+        self.timers = []     # (time the job gets ready, seq, job)
+        self.ready = []      # (-priority, due, seq, job)
+        self.hostNext = {}   # earliest start of the next call per host
+        self.seq = count()
+        self.lag = LagStats()
+        self.calls = 0
+        self.errors = 0
+        self.tasks = []
+        self.wakeup = None
+        self.readyCount = None
+
+    def add(self, camera, service, operation, params=None, interval=10, priority=0,
+            callback=None):
+        """
+        Poll `operation` of `service` every `interval` seconds;
+        `callback(job, result, error)` (possibly a coroutine function) is
+        called after each call. Higher priorities run first when late.
+        """
+        job = PollJob(camera, service, operation, params, interval, priority, callback)
+        self.jobs.add(job)
+        # Spread the first calls over a whole interval
+        self.schedule(job, monotonic() + random.uniform(0, interval))
+        return job
+
+    def remove(self, job):
+        job.active = False
+        self.jobs.discard(job)
+
+    def schedule(self, job, due):
+        job.due = due
+        self.hold(job, due)
+
+    def hold(self, job, until):
+        """ make `job` ready at `until`, keeping its due time """
+        heapq.heappush(self.timers, (until, next(self.seq), job))
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def reschedule(self, job):
+        interval = job.interval * job.backoff
+        interval *= 1 + random.uniform(-self.jitter, self.jitter)
+        # Keep the cadence, but never schedule in the past
+        self.schedule(job, max(job.due + interval, monotonic()))
+
+    def adapt(self, job, error):
+        if error is not None:
+            job.failures += 1
+            job.backoff = min(self.maxBackoff, job.backoff * 2)
+        elif job.duration > job.interval * self.slowRatio:
+            job.failures = 0
+            job.backoff = min(self.maxBackoff, job.backoff * 1.5)
+        else:
+            job.failures = 0
+            job.backoff = max(1.0, job.backoff / 2)
+
+    async def start(self):
+        self.wakeup = asyncio.Event()
+        self.readyCount = asyncio.Semaphore(0)
+        self.tasks = [asyncio.ensure_future(self.dispatch())]
+        self.tasks += [asyncio.ensure_future(self.work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def dispatch(self):
+        """ move due jobs to the ready queue
+        """
+        timers = self.timers
+        while True:
+            now = monotonic()
+            while timers and timers[0][0] <= now:
+                _, seq, job = heapq.heappop(timers)
+                if job.active:
+                    heapq.heappush(self.ready, (-job.priority, job.due, seq, job))
+                    self.readyCount.release()
+            self.wakeup.clear()
+            timeout = timers[0][0] - now if timers else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def work(self):
+        while True:
+            await self.readyCount.acquire()
+            _, due, _, job = heapq.heappop(self.ready)
+            if not job.active:
+                continue
+            now = monotonic()
+            host = job.host
+            slot = self.hostNext.get(host, now)
+            if slot > now:
+                # Too close to the previous call to this host: the lag and the
+                # next due time still count from the original due time
+                self.hold(job, slot)
+                continue
+            self.hostNext[host] = now + self.hostSpacing
+            self.lag.add(now - due)
+            await self.run(job)
+            if job.active:
+                self.reschedule(job)
+
+    async def run(self, job):
+        result = error = None
+        start = monotonic()
+        try:
+            service = job.camera.getService(job.service)
+            result = await getattr(service, job.operation)(job.params)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            error = err
+            self.errors += 1
+        job.duration = monotonic() - start
+        job.runs += 1
+        self.calls += 1
+        self.adapt(job, error)
+        if job.callback is not None:
+            try:
+                ret = job.callback(job, result, error)
+                if inspect.isawaitable(ret):
+                    await ret
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Poll callback of %r failed', job)
+
+    def metrics(self):
+        """ schedule lag (in seconds) and call counters
+        """
+        return {'jobs': len(self.jobs), 'calls': self.calls, 'errors': self.errors,
+                'pending': len(self.ready), 'lag': self.lag.asDict(),
+                'backedOff': sum(1 for job in self.jobs if job.backoff > 1)}
@@ -0,0 +1,167 @@
+""" Recording search sessions
+
+The search service works with tokens: a `Find*` operation opens a session on
+the device, results are pulled page by page with the matching
+`Get*SearchResults` operation, and `EndSearch` releases the session.
+
+>>> session = mycam.searchEvents(datetime(2020, 1, 1), scope={'IncludedRecordings': tokens})
+>>> async for result in session:
+...     print(result.RecordingToken, result.Time)
+"""
+import asyncio
+from collections import namedtuple
+from datetime import timedelta
+from time import monotonic
+
+from .exceptions import ONVIFError
+
+SK = namedtuple('SearchKind', ('find', 'results', 'items'))
+
+SEARCH_KINDS = {
+    'recordings'  : SK('FindRecordings',  'GetRecordingSearchResults',   'RecordingInformation'),
+    'events'      : SK('FindEvents',      'GetEventSearchResults',       'Result'),
+    'ptzposition' : SK('FindPTZPosition', 'GetPTZPositionSearchResults', 'Result'),
+    'metadata'    : SK('FindMetadata',    'GetMetadataSearchResults',    'Result'),
+}
+
+# Search states after which no more results will be produced
+DONE_STATES = frozenset(('Completed', 'Unknown'))
+
+
+class SearchSession:
+    """
+    One search session on a device, consumed as an async iterator.
+
+    The next page is requested as soon as the current one has been received,
+    so the round-trip overlaps with the consumer processing the current page.
+    The page size (`MaxResults`) is doubled while pages come back full and
+    faster than `targetLatency`, and halved when they are slower.
+    The search token is always released with `EndSearch`, even if the
+    consumer stops iterating early.
+
+    >>> async for page in session.pages():
+    ...     process(page)
+    """
+    def __init__(self, service, kind, params, *, pageSize=32, minPageSize=4,
+                 maxPageSize=1024, targetLatency=0.5, waitTime=timedelta(seconds=5),
+                 keepAlive=timedelta(seconds=30)):
+        try:
+            self.kind = SEARCH_KINDS[kind]
+        except KeyError:
+            raise ONVIFError('Unknown search kind %s' % kind)
+        self.service = service
+        self.params = dict(params, KeepAliveTime=keepAlive)
+        self.pageSize = pageSize
+        self.minPageSize = minPageSize
+        self.maxPageSize = maxPageSize
+        self.targetLatency = targetLatency
+        self.waitTime = waitTime
+        self.token = None
+        self.state = None
+        self.latency = None  # duration of the last page request, in seconds
+
+    async def start(self):
+        """ open the search session on the device
+        """
+        self.token = await getattr(self.service, self.kind.find)(self.params)
+        return self.token
+
+    async def end(self):
+        """ release the search token
+        """
+        token, self.token = self.token, None
+        if token is None:
+            return
+        try:
+            await self.service.EndSearch({'SearchToken': token})
+        except Exception:
+            # the device may already have dropped a completed session
+            pass
+
+    async def fetch(self):
+        """ request a single page of results
+        """
+        start = monotonic()
+        resultList = await getattr(self.service, self.kind.results)(
+            {'SearchToken': self.token, 'MaxResults': self.pageSize,
+             'WaitTime': self.waitTime})
+        latency = monotonic() - start
+        items = getattr(resultList, self.kind.items, None) or []
+        return items, resultList.SearchState, latency
+
+    def adapt(self, latency, count):
+        """ adjust the page size to the observed latency
+        """
+        self.latency = latency
+        if latency > self.targetLatency:
+            self.pageSize = max(self.minPageSize, self.pageSize // 2)
+        elif count >= self.pageSize and latency < self.targetLatency / 2:
+            self.pageSize = min(self.maxPageSize, self.pageSize * 2)
+
+    async def pages(self):
+        """ yield the results page by page, prefetching the next one
+        """
+        if self.token is None:
+            await self.start()
+        pending = asyncio.ensure_future(self.fetch())
+        try:
+            while pending is not None:
+                items, self.state, latency = await pending
+                self.adapt(latency, len(items))
+                pending = None if self.state in DONE_STATES \
+                          else asyncio.ensure_future(self.fetch())
+                if items:
+                    yield items
+        finally:
+            if pending is not None:
+                pending.cancel()
+            await self.end()
+
+    async def __aiter__(self):
+        async for page in self.pages():
+            for item in page:
+                yield item
+
+
+async def mergeSearches(sessions, limit=None):
+    """
+    Run several search sessions concurrently (e.g. one per recording set of
+    an NVR) and yield `(session, item)` pairs as they arrive.
+    At most `limit` sessions are open at the same time on the devices.
+    """
+    queue = asyncio.Queue(maxsize=1024)
+    semaphore = asyncio.Semaphore(limit) if limit else None
+    done = object()
+
+    async def run(session):
+        try:
+            if semaphore is not None:
+                async with semaphore:
+                    await feed(session)
+            else:
+                await feed(session)
+            result = done
+        except Exception as err:
+            result = err
+        await queue.put((session, result))
+
+    async def feed(session):
+        async for page in session.pages():
+            for item in page:
+                await queue.put((session, item))
+
+    tasks = [asyncio.ensure_future(run(session)) for session in sessions]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            session, item = await queue.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise ONVIFError(item)
+            else:
+                yield session, item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,113 @@
+""" Fast conversion of zeep objects into builtin types
+
+`zeep.helpers.serialize_object` inspects every value it walks. Here a
+converter is compiled once per XSD type, the first time an object of that
+type is met: simple-typed fields are copied as they are, and only complex
+or any-typed fields recurse.
+
+`toDict` returns plain dicts that can be sent back as operation parameters:
+like zeep, it keeps xsd:any content (`_value_1`, lxml elements and
+`AnyObject`s) untouched. `toJson` goes one step further and returns JSON
+bytes, where any-content is always rendered the same way: an element as its
+XML string, an `AnyObject` as its converted value.
+
+>>> toDict(await media.GetProfiles())
+>>> toJson(await events.GetEventProperties())
+"""
+from base64 import b64encode
+from datetime import date, time, timedelta
+from decimal import Decimal
+import json
+
+from lxml import etree
+from zeep.xsd import AnySimpleType, ListType
+from zeep.xsd.valueobjects import AnyObject, CompoundValue
+
+# XSD type -> converter of its CompoundValues
+_converters = {}
+
+
+def toDict(obj):
+    """ convert `obj` (a zeep object, or lists and dicts of them) into plain
+    dicts and lists
+    """
+    if isinstance(obj, CompoundValue):
+        return converterFor(obj._xsd_type)(obj)  #pylint: disable=protected-access
+    if isinstance(obj, list):
+        return [toDict(value) for value in obj]
+    if isinstance(obj, dict):
+        return {key: toDict(value) for key, value in obj.items()}
+    return obj
+
+
+def toJson(obj):
+    """ convert `obj` into JSON (UTF-8 bytes)
+    """
+    return json.dumps(toDict(obj), default=_jsonDefault, ensure_ascii=False,
+                      separators=(',', ':')).encode()
+
+
+def _jsonDefault(value):
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, bytes):
+        return b64encode(value).decode()
+    if isinstance(value, AnyObject):
+        return toDict(value.value)
+    if isinstance(value, etree._Element):  #pylint: disable=protected-access
+        return etree.tostring(value, encoding=str)
+    if isinstance(value, CompoundValue):
+        return toDict(value)
+    # isodate.Duration and other xsd values
+    return str(value)
+
+
+def _copy(value):
+    return list(value) if isinstance(value, list) else value
+
+
+def converterFor(xsdType):
+    """ converter of the CompoundValues of `xsdType`, compiled on first use
+    """
+    try:
+        return _converters[xsdType]
+    except KeyError:
+        converter = _converters[xsdType] = _compile(xsdType)
+        return converter
+
+
+def _compile(xsdType):
+    if xsdType is None:
+        # unpickled value without type
+        return _generic
+    fields = []
+    for name, element in list(xsdType.elements) + list(xsdType.attributes):
+        valueType = getattr(element, 'type', None)
+        if not isinstance(valueType, AnySimpleType):
+            expr = 'c(v[%r])'
+        elif getattr(element, 'max_occurs', 1) != 1 or isinstance(valueType, ListType):
+            expr = 'l(v[%r])'
+        else:
+            expr = 'v[%r]'
+        fields.append('%r: %s' % (name, expr % name))
+    source = ('def convert(obj):\n'
+              '    v = obj.__values__\n'
+              '    if len(v) != %d:\n'
+              '        return g(obj)\n'
+              '    try:\n'
+              '        return {%s}\n'
+              '    except KeyError:\n'
+              '        return g(obj)\n') % (len(fields), ', '.join(fields))
+    namespace = {'c': toDict, 'l': _copy, 'g': _generic}
+    exec(compile(source, '<converter %s>' % xsdType.name, 'exec'), namespace)  #pylint: disable=exec-used
+    return namespace['convert']
+
+
+def _generic(obj):
+    """ converter of CompoundValues not matching their type's fields
+    """
+    return {key: toDict(value) for key, value in obj.__values__.items()}
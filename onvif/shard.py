@@ -0,0 +1,389 @@
+""" Multi-process fleet sharding
+
+SOAP serialization and zeep deserialization are CPU bound, so a single
+process cannot keep up with a large fleet. `ShardedFleet` spreads cameras
+over a pool of worker processes by consistent hashing of their id.
+Each worker runs its own event loop, WSDL cache and HTTP connection pool;
+requests, results and events travel over a pipe as pickled tuples, written
+by a thread on each side so that neither event loop blocks on a full pipe.
+
+>>> fleet = ShardedFleet(workers=8)
+>>> await fleet.start()
+>>> await fleet.add('cam1', '192.168.0.112', 80, 'admin', '12345')
+>>> status = await fleet.call('cam1', 'ptz', 'GetStatus', {'ProfileToken': 'main'})
+>>> await fleet.subscribe('cam1')
+>>> async for camId, message in fleet.events():
+...     print(camId, message['Topic'])
+"""
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+from bisect import bisect
+from datetime import timedelta
+from itertools import count
+from time import monotonic
+
+from .exceptions import ONVIFError
+
+logger = logging.getLogger('onvif')
+
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+class HashRing:
+    """
+    Consistent hash ring: each node owns `replicas` points of the ring and
+    a key belongs to the node owning the first point after the key's hash.
+    """
+    def __init__(self, nodes, replicas=64):
+        self.replicas = replicas
+        self.points = []
+        self.owners = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(hashlib.md5(str(key).encode()).digest()[:8], 'big')
+
+    def add(self, node):
+        for i in range(self.replicas):
+            point = self.hash('%s#%d' % (node, i))
+            self.owners[point] = node
+        self.points = sorted(self.owners)
+
+    def remove(self, node):
+        self.owners = {point: owner for point, owner in self.owners.items()
+                       if owner != node}
+        self.points = sorted(self.owners)
+
+    def get(self, key):
+        if not self.points:
+            raise ONVIFError('Empty hash ring')
+        index = bisect(self.points, self.hash(key)) % len(self.points)
+        return self.owners[self.points[index]]
+
+
+def plain(obj):
+    """ convert a zeep result into picklable builtin types
+    """
+    from .client import ONVIFService
+    return _plain(ONVIFService.to_dict(obj))
+
+
+def _plain(obj):
+    if isinstance(obj, dict):
+        return {key: _plain(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_plain(value) for value in obj]
+    if obj is None or isinstance(obj, (str, bytes, bool, int, float)):
+        return obj
+    if hasattr(obj, 'tag'):
+        # xsd:any content is kept as lxml elements
+        from lxml import etree
+        return etree.tostring(obj)
+    try:
+        pickle.dumps(obj, PICKLE_PROTOCOL)
+    except Exception:
+        return str(obj)
+    return obj
+
+
+class _Sender:
+    """ writes pickled messages to a connection from a thread: a blocking
+    write on a full pipe must not stop the event loop from reading the other
+    direction, or both processes wait for each other forever
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def send(self, message):
+        self.queue.put(pickle.dumps(message, PICKLE_PROTOCOL))
+
+    def run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                return
+            try:
+                self.conn.send_bytes(data)
+            except OSError:
+                # the other side is gone
+                return
+
+    def close(self, timeout=None):
+        """ stop once the queued messages are written """
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+
+class _Worker:
+    """ worker process side: owns the cameras of one shard
+    """
+    def __init__(self, conn, wsdlDir):
+        from zeep.asyncio import AsyncTransport
+        self.conn = conn
+        self.sender = _Sender(conn)
+        self.wsdlDir = wsdlDir
+        self.loop = asyncio.get_event_loop()
+        # One connection pool for every camera of the shard
+        self.transport = AsyncTransport(self.loop)
+        self.cameras = {}
+        self.subscriptions = {}
+        self.stopped = asyncio.Event()
+
+    def send(self, *message):
+        self.sender.send(message)
+
+    def onReadable(self):
+        while self.conn.poll():
+            try:
+                message = pickle.loads(self.conn.recv_bytes())
+            except EOFError:
+                self.stopped.set()
+                return
+            if message[0] == 'stop':
+                self.stopped.set()
+                return
+            self.loop.create_task(self.dispatch(*message))
+
+    async def dispatch(self, command, reqId, camId, *args):
+        try:
+            result = await getattr(self, 'do_' + command)(camId, *args)
+            self.send('result', reqId, True, result)
+        except Exception as err:
+            self.send('result', reqId, False, str(err))
+
+    async def do_add(self, camId, host, port, user, passwd, kwargs):
+        from .client import ONVIFCamera
+        if self.wsdlDir is not None:
+            kwargs.setdefault('wsdlDir', self.wsdlDir)
+        camera = ONVIFCamera(host, port, user, passwd, transport=self.transport, **kwargs)
+        await camera.update_xaddrs()
+        self.cameras[camId] = camera
+
+    async def do_remove(self, camId):
+        task = self.subscriptions.pop(camId, None)
+        if task is not None:
+            task.cancel()
+        self.cameras.pop(camId, None)
+
+    async def do_call(self, camId, serviceName, operation, params):
+        service = self.camera(camId).getService(serviceName)
+        return plain(await getattr(service, operation)(params))
+
+    async def do_subscribe(self, camId, timeout, limit, lifetime):
+        self.camera(camId)
+        if camId not in self.subscriptions:
+            self.subscriptions[camId] = \
+                self.loop.create_task(self.pull(camId, timeout, limit, lifetime))
+
+    async def pull(self, camId, timeout, limit, lifetime):
+        """ forward the events of a pull point subscription, renewed every
+        `lifetime / 2` and created again when it fails
+        """
+        from .eventstate import _bind, _unsubscribe
+        camera = self.camera(camId)
+        events = camera.getService('events')
+        lifetime = lifetime.total_seconds()
+        while True:
+            manager = None
+            try:
+                address, = await events.CreatePullPointSubscription.project(
+                    {'InitialTerminationTime': 'PT%gS' % lifetime}, 'SubscriptionReference.Address')
+                if not address:
+                    raise ONVIFError('No pull point address')
+                manager = _bind(camera, 'subscription', address, events)
+                pullpoint = _bind(camera, 'pullpoint', address, events)
+                renewed = monotonic()
+                while True:
+                    messages = await pullpoint.PullMessages(
+                        {'Timeout': timeout, 'MessageLimit': limit})
+                    for message in messages.NotificationMessage or ():
+                        self.send('event', None, camId, plain(message))
+                    if monotonic() - renewed > lifetime / 2:
+                        try:
+                            await manager.Renew({'TerminationTime': 'PT%gS' % lifetime})
+                        except asyncio.CancelledError:
+                            raise
+                        except Exception as err:
+                            logger.debug('Renew failed on %s: %s', camera.host, err)
+                        renewed = monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                self.send('error', None, camId, str(err))
+            finally:
+                if manager is not None:
+                    await _unsubscribe(camera, manager, timeout.total_seconds())
+            await asyncio.sleep(timeout.total_seconds())
+
+    def camera(self, camId):
+        try:
+            return self.cameras[camId]
+        except KeyError:
+            raise ONVIFError('Unknown camera %s' % camId)
+
+    async def run(self):
+        self.loop.add_reader(self.conn.fileno(), self.onReadable)
+        await self.stopped.wait()
+        self.loop.remove_reader(self.conn.fileno())
+        tasks = list(self.subscriptions.values())
+        for task in tasks:
+            task.cancel()
+        # let the subscriptions be released
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.transport.session.close()
+        self.sender.close(5)
+
+
+def _workerMain(conn, wsdlDir):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(_Worker(conn, wsdlDir).run())
+    finally:
+        loop.close()
+
+
+class ShardedFleet:
+    """
+    Parent side of the sharded runner: cameras are placed on workers by
+    consistent hashing of their id and every operation is forwarded to the
+    owning worker. Results come back as plain dicts (see `plain`).
+
+    :param workers: number of worker processes, defaults to the CPU count
+    :param wsdlDir: WSDL directory used by the workers' cameras
+    """
+    def __init__(self, workers=None, wsdlDir=None, replicas=64):
+        self.size = workers or os.cpu_count() or 1
+        self.wsdlDir = wsdlDir
+        self.ring = HashRing(range(self.size), replicas)
+        self.workers = []
+        self.pending = {}
+        self.reqIds = count()
+        self.queue = asyncio.Queue()
+        self.loop = None
+        self.closing = False
+
+    async def start(self):
+        self.loop = asyncio.get_event_loop()
+        context = multiprocessing.get_context('spawn')
+        for _ in range(self.size):
+            parentConn, childConn = context.Pipe()
+            process = context.Process(target=_workerMain, args=(childConn, self.wsdlDir),
+                                      daemon=True)
+            process.start()
+            childConn.close()
+            self.loop.add_reader(parentConn.fileno(), self.onReadable, parentConn)
+            self.workers.append((process, parentConn, _Sender(parentConn)))
+
+    async def close(self):
+        self.closing = True
+        for process, conn, sender in self.workers:
+            sender.send(('stop',))
+            sender.close(5)
+        for process, conn, sender in self.workers:
+            # keep reading, so that the worker isn't stuck writing its last results
+            await self.loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
+            self.loop.remove_reader(conn.fileno())
+            conn.close()
+        self.workers = []
+        self.closing = False
+        for _, future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def onReadable(self, conn):
+        while conn.poll():
+            try:
+                kind, reqId, *payload = pickle.loads(conn.recv_bytes())
+            except (EOFError, OSError):
+                self.loop.remove_reader(conn.fileno())
+                if not self.closing:
+                    logger.error('ONVIF shard worker exited')
+                self.abort(conn)
+                return
+            if kind == 'result':
+                _, future = self.pending.pop(reqId, (None, None))
+                if future is None or future.done():
+                    continue
+                ok, result = payload
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(ONVIFError(result))
+            else:
+                # ('event' | 'error', camId, payload)
+                self.queue.put_nowait((kind, *payload))
+
+    def abort(self, conn):
+        """ fail the requests pending on a dead worker
+        """
+        for reqId, (owner, future) in list(self.pending.items()):
+            if owner is conn:
+                del self.pending[reqId]
+                if not future.done():
+                    future.set_exception(ONVIFError('shard worker exited'))
+
+    def worker(self, camId):
+        """ index of the worker owning `camId`
+        """
+        return self.ring.get(camId)
+
+    def request(self, command, camId, *args):
+        if not self.workers:
+            raise ONVIFError('Sharded fleet is not started')
+        reqId = next(self.reqIds)
+        _, conn, sender = self.workers[self.worker(camId)]
+        future = self.loop.create_future()
+        self.pending[reqId] = conn, future
+        sender.send((command, reqId, camId) + args)
+        return future
+
+    def add(self, camId, host, port, user, passwd, **kwargs):
+        """ create the camera on its worker and discover its services
+        """
+        return self.request('add', camId, host, port, user, passwd, kwargs)
+
+    def remove(self, camId):
+        return self.request('remove', camId)
+
+    def call(self, camId, service, operation, params=None):
+        """ run `service.operation(params)` on the camera's worker
+        """
+        return self.request('call', camId, service, operation, params)
+
+    def subscribe(self, camId, timeout=timedelta(seconds=10), limit=100,
+                  lifetime=timedelta(seconds=60)):
+        """ start pulling the camera's events on its worker, see `events`;
+        the subscription is renewed every `lifetime / 2`
+        """
+        return self.request('subscribe', camId, timeout, limit, lifetime)
+
+    async def events(self):
+        """ yield `(camId, message)` for the events of subscribed cameras
+        """
+        while True:
+            kind, camId, payload = await self.queue.get()
+            if kind == 'event':
+                yield camId, payload
+            else:
+                logger.warning('Event subscription of %s failed: %s', camId, payload)
@@ -0,0 +1,168 @@
+""" JPEG snapshots
+
+Snapshot URIs are cached per profile on the camera, images are downloaded
+with the HTTP session and HTTP credentials of the camera's SOAP transport,
+and at most a few downloads run concurrently on the same host.
+
+>>> shot = await mycam.snapshot()
+>>> shot.size, shot.latency
+>>> shot = await mycam.snapshot(into=bytearray(1 << 20))  # preallocated buffer
+>>> async for camera, shot in fetchSnapshots(cameras, into=lambda cam: '/tmp/%s.jpg' % cam.host):
+...     print(camera.host, shot.latency)
+"""
+import asyncio
+from collections import namedtuple, defaultdict
+from pathlib import Path
+from time import monotonic
+from urllib.parse import urlsplit
+
+from .exceptions import ONVIFError
+from .transport import requestUri
+
+CHUNK_SIZE = 1 << 16
+
+Snapshot = namedtuple('Snapshot', ('profile', 'uri', 'contentType', 'size', 'latency', 'data'))
+Snapshot.__doc__ = """ a downloaded image; `data` is the image bytes, a view on the
+target buffer, or None when written to a file; `latency` is in seconds """
+
+
+class HostLimiter:
+    """ limit the number of concurrent downloads per host
+    """
+    def __init__(self, limit=2):
+        self.limit = limit
+        self.semaphores = defaultdict(lambda: asyncio.Semaphore(self.limit))
+
+    def __call__(self, host):
+        return self.semaphores[host]
+
+
+# Shared by every camera unless told otherwise
+hostLimiter = HostLimiter()
+
+
+async def snapshotUri(camera, profileToken=None):
+    """ get (and maybe query) the snapshot URI of a profile from the camera's cache;
+    the default profile is the camera's first one, cached as well
+    """
+    media = camera.getService('media')
+    if profileToken is None:
+        profileToken = camera.snapshotProfile
+    if profileToken is None:
+        profiles = await media.GetProfiles.project(None, 'token', each='Profiles')
+        if not profiles:
+            raise ONVIFError('No media profile')
+        profileToken = camera.snapshotProfile = profiles[0][0]
+    try:
+        return profileToken, camera.snapshotUris[profileToken]
+    except KeyError:
+        pass
+    uri, = await media.GetSnapshotUri.project({'ProfileToken': profileToken}, 'Uri')
+    if not uri:
+        raise ONVIFError('No snapshot URI for profile %s' % profileToken)
+    camera.snapshotUris[profileToken] = uri
+    return profileToken, uri
+
+
+async def _download(session, uri, headers, into):
+    """ GET `uri` and stream its body into `into`;
+    returns the response and `(size, data)`
+    """
+    response = await session.get(uri, headers=headers)
+    try:
+        if response.status != 200:
+            return response, None
+        if into is None:
+            data = await response.read()
+            return response, (len(data), data)
+        if isinstance(into, (str, Path)):
+            with open(str(into), 'wb') as output:
+                size = await _stream(response, output.write)
+            return response, (size, None)
+        if hasattr(into, 'write'):
+            return response, (await _stream(response, into.write), None)
+        # preallocated buffer
+        view = memoryview(into).cast('B')
+        size = 0
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            end = size + len(chunk)
+            if end > len(view):
+                raise ONVIFError('Snapshot larger than the %d bytes buffer' % len(view))
+            view[size:end] = chunk
+            size = end
+        return response, (size, view[:size])
+    finally:
+        response.release()
+
+
+async def _stream(response, write):
+    size = 0
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        write(chunk)
+        size += len(chunk)
+    return size
+
+
+async def fetchSnapshot(camera, profileToken=None, into=None, limiter=hostLimiter):
+    """
+    Download a snapshot of `camera`.
+
+    :param into: None to return the bytes, a writable buffer (bytearray,
+    memoryview, ...) to fill, a file path or a file object to write to
+    :param limiter: callable returning the semaphore of a host
+    """
+    profileToken, uri = await snapshotUri(camera, profileToken)
+    session = camera.getService('media').client.transport.session
+    path = requestUri(uri)
+    auth = camera.httpAuth
+    start = monotonic()
+    async with limiter(urlsplit(uri).hostname):
+        try:
+            # Same credentials (and Digest nonce) as the SOAP requests
+            authorization = auth.authorization('GET', path)
+            headers = {} if authorization is None else {'Authorization': authorization}
+            response, result = await _download(session, uri, headers, into)
+            if response.status == 401 and \
+               auth.update(response.headers.getall('WWW-Authenticate', ()), authorization):
+                headers['Authorization'] = auth.authorization('GET', path)
+                response, result = await _download(session, uri, headers, into)
+        except ONVIFError:
+            raise
+        except Exception as err:
+            raise ONVIFError(err)
+    if result is None:
+        if response.status in (400, 404):
+            # The URI (or the profile) may be invalid after a reboot, query it again next time
+            camera.snapshotUris.pop(profileToken, None)
+            if camera.snapshotProfile == profileToken:
+                camera.snapshotProfile = None
+        raise ONVIFError('Snapshot of %s failed with HTTP status %d' % (uri, response.status))
+    size, data = result
+    return Snapshot(profileToken, uri, response.headers.get('Content-Type'),
+                    size, monotonic() - start, data)
+
+
+async def fetchSnapshots(cameras, into=None, limit=64, limiter=hostLimiter):
+    """
+    Download a snapshot of each camera, at most `limit` at a time, and yield
+    `(camera, Snapshot)` pairs as they complete (`(camera, ONVIFError)` on
+    failure). `into` is either None or a callable returning the target of
+    a camera, see `fetchSnapshot`.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def fetch(camera):
+        async with semaphore:
+            try:
+                target = None if into is None else into(camera)
+                return camera, await fetchSnapshot(camera, into=target, limiter=limiter)
+            except ONVIFError as err:
+                return camera, err
+
+    tasks = [asyncio.ensure_future(fetch(camera)) for camera in cameras]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,211 @@
+""" aiohttp transport with HTTP authentication and compression
+"""
+import gzip
+import inspect
+from time import process_time
+from urllib.parse import urlsplit
+import zlib
+
+from aiohttp import ClientSession
+from zeep.asyncio import AsyncTransport
+from zeep.asyncio.transport import aio_timeout
+from zeep.wsdl.utils import etree_to_string
+
+# Older aiohttp versions always decompress the responses themselves
+PER_REQUEST_DECOMPRESS = 'auto_decompress' in inspect.signature(ClientSession._request).parameters  #pylint: disable=protected-access
+ACCEPT_ENCODING = 'gzip, deflate'
+# Statuses of servers not understanding a compressed request
+REJECTED = frozenset((400, 411, 413, 415, 500))
+
+
+def requestUri(address):
+    """ request-target of an URL, as used by Digest authentication
+    """
+    split = urlsplit(address)
+    return (split.path or '/') + ('?' + split.query if split.query else '')
+
+
+def isEnvelope(content, encoding=None):
+    """ whether a response body (with Content-Encoding `encoding`) is a SOAP
+    envelope; only its start is decompressed
+    """
+    if (encoding or '').strip().lower() in ('gzip', 'x-gzip', 'deflate'):
+        # gzip or zlib header, else raw deflate stream
+        for wbits in (32 + zlib.MAX_WBITS, -zlib.MAX_WBITS):
+            try:
+                content = zlib.decompressobj(wbits).decompress(content, 1024)
+                break
+            except zlib.error:
+                pass
+    return b'Envelope' in content[:1024]
+
+
+class HTTPCompression:
+    """
+    HTTP compression state of a camera: the encoding of its responses, and
+    whether it accepts compressed requests (None until known), with
+    counters of the bytes saved and of the CPU time spent on compression.
+
+    :param compressAbove: gzip requests larger than this size (in bytes),
+    None to never compress them
+    """
+    def __init__(self, compressAbove=None, level=6):
+        self.compressAbove = compressAbove
+        self.level = level
+        self.responseEncoding = None   # '' when the camera doesn't compress
+        self.acceptsRequests = None
+        self.responses = 0
+        self.responseBytes = 0         # after decompression
+        self.responseWireBytes = 0
+        self.requests = 0
+        self.requestBytes = 0
+        self.requestWireBytes = 0
+        self.cpuTime = 0.0
+
+    def encodeRequest(self, message):
+        """ `(body, Content-Encoding)` of a request, the encoding being None
+        when `message` is sent as is
+        """
+        if self.compressAbove is None or self.acceptsRequests is False or \
+           len(message) <= self.compressAbove:
+            return message, None
+        start = process_time()
+        body = gzip.compress(message, self.level)
+        self.cpuTime += process_time() - start
+        return body, 'gzip'
+
+    def countRequest(self, message, body):
+        self.requests += 1
+        self.requestBytes += len(message)
+        self.requestWireBytes += len(body)
+
+    def decodeResponse(self, content, encoding, wireSize=None):
+        """ decompress a response body with Content-Encoding `encoding`;
+        `wireSize` is the size on the wire when `content` is already decoded
+        """
+        encoding = (encoding or '').strip().lower()
+        self.responseEncoding = encoding
+        self.responses += 1
+        if wireSize is None:
+            wireSize = len(content)
+            if encoding in ('gzip', 'x-gzip', 'deflate'):
+                start = process_time()
+                try:
+                    if encoding == 'deflate':
+                        try:
+                            content = zlib.decompress(content)
+                        except zlib.error:
+                            # raw deflate stream, without zlib header
+                            content = zlib.decompress(content, -zlib.MAX_WBITS)
+                    else:
+                        content = zlib.decompress(content, 16 + zlib.MAX_WBITS)
+                finally:
+                    self.cpuTime += process_time() - start
+        self.responseWireBytes += wireSize
+        self.responseBytes += len(content)
+        return content
+
+    def metrics(self):
+        return {'responseEncoding': self.responseEncoding,
+                'acceptsRequests': self.acceptsRequests,
+                'responses': self.responses, 'requests': self.requests,
+                'bytesSaved': self.responseBytes - self.responseWireBytes
+                              + self.requestBytes - self.requestWireBytes,
+                'responseBytes': self.responseBytes,
+                'responseWireBytes': self.responseWireBytes,
+                'requestBytes': self.requestBytes,
+                'requestWireBytes': self.requestWireBytes,
+                'cpuTime': self.cpuTime}
+
+
+class ONVIFTransport(AsyncTransport):
+    """
+    Transport answering HTTP Basic / Digest challenges with the credentials
+    of `auth` (an `onvif.auth.HTTPAuth`), pre-emptively once the scheme of
+    the camera is known, and negotiating gzip/deflate compression with the
+    state of `compression` (an `HTTPCompression`). Several transports can
+    share the same aiohttp session, i.e. the same connection pool.
+    """
+    # first request, and answers to a new or stale challenge
+    maxAttempts = 3
+
+    def __init__(self, loop=None, auth=None, compression=None, **kwargs):
+        super().__init__(loop, **kwargs)
+        self.auth = auth
+        self.compression = HTTPCompression() if compression is None else compression
+
+    @classmethod
+    def bind(cls, transport, auth, compression=None):
+        """ new transport for `auth` and `compression`, sharing the session and
+        settings of `transport`
+        """
+        if transport is None:
+            return cls(auth=auth, compression=compression)
+        return cls(transport.loop, auth=auth, compression=compression, cache=transport.cache,
+                   timeout=transport.load_timeout,
+                   operation_timeout=transport.operation_timeout,
+                   session=transport.session, verify_ssl=transport.verify_ssl,
+                   proxy=transport.proxy)
+
+    async def post_xml(self, address, envelope, headers):
+        response = await self.post(address, etree_to_string(envelope), headers)
+        return await self.new_response(response)
+
+    async def post(self, address, message, headers):
+        compression = self.compression
+        headers = dict(headers, **{'Accept-Encoding': ACCEPT_ENCODING})
+        body, encoding = compression.encodeRequest(message)
+        if encoding is not None:
+            response = await self.authorizedPost(
+                address, body, dict(headers, **{'Content-Encoding': encoding}))
+            # A SOAP answer (faults included) means the request was processed:
+            # sending it again could repeat a write
+            if compression.acceptsRequests is not None or response.status not in REJECTED \
+               or isEnvelope(await response.read(), response.headers.get('Content-Encoding')):
+                if response.status < 300:
+                    compression.acceptsRequests = True
+                compression.countRequest(message, body)
+                return response
+            # Not understood, try again without compression
+            status = response.status
+            response.release()
+        response = await self.authorizedPost(address, message, headers)
+        if encoding is not None and response.status != status:
+            compression.acceptsRequests = False
+        compression.countRequest(message, message)
+        return response
+
+    async def authorizedPost(self, address, message, headers):
+        if self.auth is None:
+            return await self.send(address, message, headers)
+        uri = requestUri(address)
+        attempts = self.maxAttempts
+        while True:
+            authorization = self.auth.authorization('POST', uri)
+            if authorization is not None:
+                headers = dict(headers, Authorization=authorization)
+            response = await self.send(address, message, headers)
+            attempts -= 1
+            if response.status != 401 or not attempts or \
+               not self.auth.update(response.headers.getall('WWW-Authenticate', ()),
+                                    authorization):
+                return response
+            # Free the connection of the challenge before trying again
+            response.release()
+
+    async def send(self, address, message, headers):
+        kwargs = {'auto_decompress': False} if PER_REQUEST_DECOMPRESS else {}
+        with aio_timeout(self.operation_timeout):
+            return await self.session.post(address, data=message, headers=headers,
+                                           verify_ssl=self.verify_ssl, proxy=self.proxy,
+                                           **kwargs)
+
+    async def new_response(self, response):
+        new = await super().new_response(response)
+        wireSize = None
+        if not PER_REQUEST_DECOMPRESS:
+            length = response.headers.get('Content-Length')
+            wireSize = int(length) if length and length.isdigit() else len(new.content)
+        new._content = self.compression.decodeResponse(  #pylint: disable=protected-access
+            new.content, response.headers.get('Content-Encoding'), wireSize)
+        return new
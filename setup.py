@@ -26,13 +26,18 @@ CLASSIFIERS = [
     'Topic :: Utilities',
     "Programming Language :: Python",
     "Programming Language :: Python :: 3",
-    "Programming Language :: Python :: 3.5",
+    "Programming Language :: Python :: 3.7",
 ]
 
-wsdl_files = [os.path.join('wsdl', item) for item in os.listdir('wsdl')]
 wsdl_dst_dir = 'Lib/site-packages/wsdl' if sys.platform == 'win32' else \
                'lib/python%d.%d/site-packages/wsdl' % (sys.version_info.major,
                                                        sys.version_info.minor)
+# Keep the layout of the official ONVIF files (e.g. wsdl/ver20/media/wsdl/)
+wsdl_data_files = [
+    (os.path.normpath(os.path.join(wsdl_dst_dir, os.path.relpath(root, 'wsdl'))),
+     [os.path.join(root, item) for item in files])
+    for root, dirs, files in os.walk('wsdl') if files
+]
 
 setup(
       name='onvif-zeep-async',
@@ -50,7 +55,7 @@ setup(
       packages=find_packages(exclude=['docs', 'examples', 'tests']),
       install_requires=requires,
       include_package_data=True,
-      data_files=[(wsdl_dst_dir, wsdl_files)],
+      data_files=wsdl_data_files,
       entry_points={
         'console_scripts': ['onvif-cli = onvif.cli:main']
       }
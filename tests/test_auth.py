@@ -0,0 +1,177 @@
+#!/usr/bin/python
+# -*-coding=utf-8
+""" HTTP authentication: RFC 7616 / RFC 2617 Digest examples, challenge
+handling of `HTTPAuth`, and the WS-Security fallback of `update_xaddrs`
+"""
+import asyncio
+import unittest
+
+from zeep.exceptions import Fault, TransportError
+
+from onvif.auth import HTTPAuth, digestAuthorization, parseChallenge, pickChallenge
+from onvif.client import ONVIFCamera, authFailed
+
+RFC7616 = {'realm': 'http-auth@example.org', 'qop': 'auth, auth-int',
+           'nonce': '7ypf/xlj9XXwfDPEoM4URrv/xwf94BcCAzFZH4GiTo0v',
+           'opaque': 'FQhe/qaU925kfnzjCev0ciny7QMkPqMAFRtzCUYo5tdS'}
+RFC7616_CNONCE = 'f2/wE4q74E6zIJEtWaHKaf5wv/H5QzzpXusqGemxURZJ'
+
+
+def field(authorization, name):
+    return parseChallenge(authorization)[1][name]
+
+
+class TestDigest(unittest.TestCase):
+
+    def test_rfc7616_md5(self):
+        authorization = digestAuthorization(dict(RFC7616, algorithm='MD5'), 'GET',
+                                            '/dir/index.html', 'Mufasa', 'Circle of Life',
+                                            cnonce=RFC7616_CNONCE)
+        self.assertTrue(authorization.startswith('Digest '))
+        self.assertEqual(field(authorization, 'response'), '8ca523f5e9506fed4657c9700eebdbec')
+        self.assertEqual(field(authorization, 'nc'), '00000001')
+        self.assertEqual(field(authorization, 'qop'), 'auth')
+        self.assertEqual(field(authorization, 'opaque'), RFC7616['opaque'])
+
+    def test_rfc7616_sha256(self):
+        authorization = digestAuthorization(dict(RFC7616, algorithm='SHA-256'), 'GET',
+                                            '/dir/index.html', 'Mufasa', 'Circle of Life',
+                                            cnonce=RFC7616_CNONCE)
+        self.assertEqual(field(authorization, 'response'),
+                         '753927fa0e85d155564e2e272a28d1802ca10daf4496794697cf8db5856cb6c1')
+        self.assertEqual(field(authorization, 'algorithm'), 'SHA-256')
+
+    def test_rfc2617(self):
+        challenge = {'realm': 'testrealm@host.com', 'qop': 'auth,auth-int',
+                     'nonce': 'dcd98b7102dd2f0e8b11d0f600bfb0c093',
+                     'opaque': '5ccc069c403ebaf9f0171e9517f40e41'}
+        authorization = digestAuthorization(challenge, 'GET', '/dir/index.html',
+                                            'Mufasa', 'Circle Of Life', cnonce='0a4f113b')
+        self.assertEqual(field(authorization, 'response'), '6629fae49393a05397450978507c4ef1')
+
+    def test_unsupported_algorithm(self):
+        with self.assertRaises(ValueError):
+            digestAuthorization(dict(RFC7616, algorithm='SHA-512-256'), 'GET', '/',
+                                'user', 'pass')
+
+    def test_pick_challenge(self):
+        scheme, params = pickChallenge(['Basic realm="cam"',
+                                        'Digest realm="cam", nonce="abc", qop="auth"'])
+        self.assertEqual(scheme, 'digest')
+        self.assertEqual(params['nonce'], 'abc')
+        self.assertEqual(pickChallenge(['Negotiate']), (None, {}))
+
+
+class TestHTTPAuth(unittest.TestCase):
+
+    def setUp(self):
+        self.auth = HTTPAuth('user', 'pass')
+
+    def test_preemptive_nonce_count(self):
+        self.assertIsNone(self.auth.authorization('POST', '/onvif'))
+        self.assertTrue(self.auth.update(['Digest realm="cam", nonce="n1", qop="auth"']))
+        self.assertEqual(field(self.auth.authorization('POST', '/onvif'), 'nc'), '00000001')
+        self.assertEqual(field(self.auth.authorization('POST', '/onvif'), 'nc'), '00000002')
+
+    def test_digest_retry_rules(self):
+        self.auth.update(['Digest realm="cam", nonce="n1", qop="auth"'])
+        sent = self.auth.authorization('POST', '/onvif')
+        # same nonce, not stale: the credentials are wrong
+        self.assertFalse(self.auth.update(['Digest realm="cam", nonce="n1", qop="auth"'], sent))
+        sent = self.auth.authorization('POST', '/onvif')
+        # stale nonce: retry with the new one, nonce count restarted
+        self.assertTrue(self.auth.update(
+            ['Digest realm="cam", nonce="n2", qop="auth", stale=true'], sent))
+        sent = self.auth.authorization('POST', '/onvif')
+        self.assertEqual(field(sent, 'nc'), '00000001')
+        self.assertEqual(field(sent, 'nonce'), 'n2')
+        # new nonce without stale flag: retry too
+        self.assertTrue(self.auth.update(['Digest realm="cam", nonce="n3", qop="auth"'], sent))
+
+    def test_basic_retry_rules(self):
+        self.assertTrue(self.auth.update(['Basic realm="cam"']))
+        sent = self.auth.authorization('POST', '/onvif')
+        self.assertEqual(sent, 'Basic dXNlcjpwYXNz')
+        self.assertFalse(self.auth.update(['Basic realm="cam"'], sent))
+
+    def test_unknown_scheme(self):
+        self.assertFalse(self.auth.update(['Negotiate']))
+        self.assertIsNone(self.auth.scheme)
+
+
+class FakeDeviceMgmt:
+    """ devicemgmt service failing GetCapabilities with `errors`, in order,
+    and recording the WS-Security token of each call """
+
+    def __init__(self, camera, *errors):
+        self.camera = camera
+        self.errors = list(errors)
+        self.wsse = []
+
+    async def GetCapabilities(self, params):
+        self.wsse.append(self.camera.wsse)
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'Extension': None}
+
+    def __getattr__(self, name):
+        raise AttributeError(name)
+
+
+async def updateXAddrs(*errors):
+    """ `(camera, initial token, tokens sent, error)` of an update_xaddrs run
+    whose GetCapabilities calls fail with `errors`
+    """
+    camera = ONVIFCamera('cam', 80, 'user', 'pass')
+    devicemgmt = FakeDeviceMgmt(camera, *errors)
+
+    def getService(name):
+        if name == 'devicemgmt':
+            return devicemgmt
+        raise AttributeError(name)
+
+    camera.getService = getService
+    wsse = camera.wsse
+    try:
+        await camera.update_xaddrs()
+    except Exception as err:
+        return camera, wsse, devicemgmt.wsse, err
+    finally:
+        await camera.transport.session.close()
+    return camera, wsse, devicemgmt.wsse, None
+
+
+class TestAuthFallback(unittest.TestCase):
+
+    def test_auth_failed(self):
+        self.assertTrue(authFailed(TransportError('', status_code=401)))
+        self.assertFalse(authFailed(TransportError('', status_code=500)))
+        self.assertTrue(authFailed(Fault('Not authorized', code='{urn:soap}Sender',
+                                         subcodes=['{urn:ter}NotAuthorized'])))
+        self.assertTrue(authFailed(Fault('Denied', code='wsse:FailedAuthentication')))
+        self.assertFalse(authFailed(Fault('Bad', code='{urn:soap}Sender',
+                                          subcodes=['{urn:ter}InvalidArgVal'])))
+        self.assertFalse(authFailed(OSError('Connection refused')))
+
+    def test_connection_error_keeps_wsse(self):
+        camera, wsse, sent, error = asyncio.run(updateXAddrs(OSError('Connection refused')))
+        self.assertIsInstance(error, OSError)
+        self.assertIs(camera.wsse, wsse)
+        self.assertEqual(sent, [wsse])
+
+    def test_fallback(self):
+        camera, wsse, sent, error = asyncio.run(updateXAddrs(TransportError('', status_code=401)))
+        self.assertIsNone(error)
+        self.assertIsNone(camera.wsse)
+        self.assertEqual(sent, [wsse, None])
+
+    def test_failed_fallback_restores_wsse(self):
+        camera, wsse, sent, error = asyncio.run(updateXAddrs(
+            TransportError('', status_code=401), OSError('Connection reset')))
+        self.assertIsInstance(error, OSError)
+        self.assertIs(camera.wsse, wsse)
+        self.assertEqual(sent, [wsse, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
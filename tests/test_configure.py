@@ -0,0 +1,143 @@
+#!/usr/bin/python
+# -*-coding=utf-8
+""" Configuration push: comparison and merge of the wanted values, and
+failure reporting of `pushConfiguration` against fake cameras
+"""
+import asyncio
+import unittest
+
+from zeep.exceptions import Fault
+
+from onvif.configure import Setting, diff, merge, pushConfiguration
+from onvif.exceptions import ONVIFError
+
+NTP = {'FromDHCP': True, 'NTPFromDHCP': [{'Type': 'IPv4', 'IPv4Address': '10.0.0.254'}],
+       'NTPManual': [], 'Extension': None}
+MANUAL = {'FromDHCP': False, 'NTPManual': [{'Type': 'IPv4', 'IPv4Address': '10.0.0.1'}]}
+
+
+class FakeDevice:
+    """ devicemgmt service of a fake camera; `error` is raised by the setters
+    (or by every call if `down`)
+    """
+    def __init__(self, error=None, down=False):
+        self.ntp = dict(NTP)
+        self.dns = {'FromDHCP': True, 'SearchDomain': [], 'DNSManual': []}
+        self.error = error
+        self.down = down
+        self.writes = []
+
+    async def call(self, name, value=None):
+        await asyncio.sleep(0)
+        if self.down:
+            raise OSError('Cannot connect to host')
+        if value is not None:
+            self.writes.append(name)
+            if self.error is not None:
+                raise self.error
+        return value
+
+    async def GetNTP(self, params):
+        await self.call('GetNTP')
+        return self.ntp
+
+    async def SetNTP(self, params):
+        await self.call('SetNTP', params)
+        self.ntp = dict(self.ntp, **params)
+
+    async def GetDNS(self, params):
+        await self.call('GetDNS')
+        return self.dns
+
+    async def SetDNS(self, params):
+        await self.call('SetDNS', params)
+        self.dns = dict(self.dns, **params)
+
+
+class FakeCamera:
+
+    def __init__(self, host, device):
+        self.host = host
+        self.device = device
+
+    def getService(self, name):
+        return self.device
+
+
+def push(cameras, settings, **kwargs):
+    async def run():
+        return [event async for event in pushConfiguration(cameras, settings, **kwargs)]
+    return asyncio.run(run())
+
+
+class TestCompare(unittest.TestCase):
+
+    def test_diff(self):
+        self.assertEqual(diff(NTP, {'FromDHCP': 'true'}), {})
+        self.assertEqual(diff({'Quality': 5}, {'Quality': 5.0}), {})
+        self.assertEqual(diff(NTP, MANUAL), {
+            'FromDHCP': (True, False),
+            'NTPManual': ([], MANUAL['NTPManual'])})
+        self.assertEqual(diff({'Resolution': {'Width': 1920, 'Height': 1080}},
+                              {'Resolution': {'Width': 1280}}),
+                         {'Resolution.Width': (1920, 1280)})
+        self.assertEqual(diff({'Items': [{'A': 1}, {'A': 2}]}, {'Items': [{'A': 1}, {'A': 3}]}),
+                         {'Items.1.A': (2, 3)})
+        self.assertEqual(diff({'Rate': None}, {'Rate': {'Limit': 25}}),
+                         {'Rate': (None, {'Limit': 25})})
+
+    def test_merge(self):
+        current = {'Name': 've', 'Resolution': {'Width': 1920, 'Height': 1080},
+                   'Multicast': [1, 2]}
+        merged = merge(current, {'Resolution': {'Width': 1280}, 'Multicast': [3]})
+        self.assertEqual(merged, {'Name': 've', 'Resolution': {'Width': 1280, 'Height': 1080},
+                                  'Multicast': [3]})
+        # `current` is left untouched
+        self.assertEqual(current['Resolution']['Width'], 1920)
+
+    def test_request(self):
+        self.assertEqual(Setting.ntp(MANUAL).request(NTP), MANUAL)
+        setting = Setting.videoEncoder('ve0', {'Quality': 4})
+        self.assertEqual(setting.request({'token': 've0', 'Quality': 5}),
+                         {'Configuration': {'token': 've0', 'Quality': 4},
+                          'ForcePersistence': True})
+
+
+class TestPush(unittest.TestCase):
+
+    def test_verified(self):
+        device = FakeDevice()
+        events = push([FakeCamera('cam1', device)], [Setting.ntp(MANUAL)])
+        self.assertEqual([event.state for event in events], ['differs', 'verified'])
+        self.assertEqual(device.writes, ['SetNTP'])
+        # already applied: nothing written
+        events = push([FakeCamera('cam1', device)], [Setting.ntp(MANUAL)])
+        self.assertEqual([event.state for event in events], ['unchanged'])
+        self.assertEqual(device.writes, ['SetNTP'])
+
+    def test_dry_run(self):
+        device = FakeDevice()
+        events = push([FakeCamera('cam1', device)], [Setting.ntp(MANUAL)], dryRun=True)
+        self.assertEqual([event.state for event in events], ['differs'])
+        self.assertEqual(device.writes, [])
+
+    def test_failures(self):
+        faulty = FakeDevice(Fault('Invalid NTP server', code='Sender'))
+        cameras = [FakeCamera('faulty', faulty), FakeCamera('down', FakeDevice(down=True)),
+                   FakeCamera('ok', FakeDevice())]
+        settings = [Setting.ntp(MANUAL), Setting.dns({'FromDHCP': False})]
+        events = push(cameras, settings)
+        states = {}
+        for event in events:
+            states.setdefault(event.camera.host, []).append(event.state)
+            if event.state == 'failed':
+                self.assertIsInstance(event.error, ONVIFError)
+        self.assertEqual(states['faulty'], ['differs', 'differs', 'failed', 'skipped'])
+        self.assertEqual(states['down'], ['failed', 'failed'])
+        self.assertEqual(states['ok'], ['differs', 'differs', 'verified', 'verified'])
+        # the DNS setting of the faulty camera was never written
+        self.assertEqual(faulty.writes, ['SetNTP'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+#!/usr/bin/python
+# -*-coding=utf-8
+""" Configuration drift: canonical hashes, differences of plain objects,
+and sweeps of fake cameras answering canned responses
+"""
+import asyncio
+import unittest
+
+from lxml import etree
+
+from onvif.definition import SERVICES
+from onvif.drift import Section, SnapshotStore, canonicalHash, deepDiff, sweep, sweepFleet
+from onvif.exceptions import ONVIFError
+from onvif.raw import RawResponse
+
+from test_serialize import ENVELOPE, NS, ROOT
+
+DEVICE = SERVICES['devicemgmt']
+
+HOSTNAME = ('<tds:GetHostnameResponse xmlns:tds="http://www.onvif.org/ver10/device/wsdl"'
+            ' xmlns:tt="http://www.onvif.org/ver10/schema">'
+            '<tds:HostnameInformation><tt:FromDHCP>false</tt:FromDHCP>'
+            '<tt:Name>%s</tt:Name></tds:HostnameInformation></tds:GetHostnameResponse>')
+# same content, other prefixes and indentation
+HOSTNAME_REFORMATTED = (
+    '<d:GetHostnameResponse xmlns:d="http://www.onvif.org/ver10/device/wsdl"'
+    ' xmlns:s="http://www.onvif.org/ver10/schema">\n  <d:HostnameInformation>\n'
+    '    <s:FromDHCP> false </s:FromDHCP>\n    <s:Name>%s</s:Name>\n'
+    '  </d:HostnameInformation>\n</d:GetHostnameResponse>')
+INFORMATION = (
+    '<tds:GetDeviceInformationResponse xmlns:tds="http://www.onvif.org/ver10/device/wsdl">'
+    '<tds:Manufacturer>Acme</tds:Manufacturer><tds:Model>C1</tds:Model>'
+    '<tds:FirmwareVersion>%s</tds:FirmwareVersion><tds:SerialNumber>42</tds:SerialNumber>'
+    '<tds:HardwareId>1</tds:HardwareId></tds:GetDeviceInformationResponse>')
+
+SECTIONS = (Section('hostname', 'devicemgmt', 'GetHostname', None),
+            Section('information', 'devicemgmt', 'GetDeviceInformation', None))
+
+
+class FakeDevice:
+    """ devicemgmt service answering the bodies of `responses` """
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    async def raw(self, operation, params=None):
+        await asyncio.sleep(0)
+        try:
+            body = self.responses[operation]
+        except KeyError:
+            raise ONVIFError('Operation %s not supported' % operation)
+        content = (ENVELOPE % {'ns': NS, 'body': body}).encode()
+        return RawResponse(ROOT / 'wsdl' / DEVICE.wsdl, '{%s}%s' % (DEVICE.ns, DEVICE.binding),
+                           operation, content)
+
+
+class FakeCamera:
+
+    def __init__(self, host, responses, port=80):
+        self.host = host
+        self.port = port
+        self.device = FakeDevice(responses)
+
+    def getService(self, name):
+        return self.device
+
+
+def run(camera, store, sections=SECTIONS):
+    return asyncio.run(sweep(camera, store, sections))
+
+
+class TestCompare(unittest.TestCase):
+
+    def test_canonical_hash(self):
+        def hashOf(body):
+            return canonicalHash(etree.fromstring(body))
+        self.assertEqual(hashOf(HOSTNAME % 'cam1'), hashOf(HOSTNAME_REFORMATTED % 'cam1'))
+        self.assertNotEqual(hashOf(HOSTNAME % 'cam1'), hashOf(HOSTNAME % 'cam2'))
+        self.assertEqual(hashOf('<a xmlns="urn:a" x="1" y="2"/>'),
+                         hashOf('<p:a xmlns:p="urn:a" y="2" x="1"><!-- note --></p:a>'))
+        # same text in another element
+        self.assertNotEqual(hashOf('<a><b>1</b><c/></a>'), hashOf('<a><b/><c>1</c></a>'))
+
+    def test_deep_diff(self):
+        self.assertEqual(deepDiff({'A': 1, 'B': [1, 2]}, {'A': 1, 'B': [1, 2]}), {})
+        self.assertEqual(deepDiff({'A': {'B': 1, 'C': 2}}, {'A': {'B': 1, 'C': 3, 'D': 4}}),
+                         {'A.C': (2, 3), 'A.D': (None, 4)})
+        self.assertEqual(deepDiff({'L': [{'X': 1}, {'X': 2}]}, {'L': [{'X': 1}]}),
+                         {'L.1': ({'X': 2}, None)})
+        self.assertEqual(deepDiff([1], {'A': 1}), {'': ([1], {'A': 1})})
+
+
+class TestSweep(unittest.TestCase):
+
+    def setUp(self):
+        self.store = SnapshotStore()
+        self.responses = {'GetHostname': HOSTNAME % 'cam1',
+                          'GetDeviceInformation': INFORMATION % '1.0'}
+        self.camera = FakeCamera('cam1', self.responses)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_changes(self):
+        result = run(self.camera, self.store)
+        self.assertEqual(result.changed, {'hostname': None, 'information': None})
+        self.assertEqual(result.errors, {})
+        # only the formatting changed
+        self.responses['GetHostname'] = HOSTNAME_REFORMATTED % 'cam1'
+        result = run(self.camera, self.store)
+        self.assertEqual(result.changed, {})
+        self.assertEqual(sorted(result.unchanged), ['hostname', 'information'])
+        self.responses['GetDeviceInformation'] = INFORMATION % '1.1'
+        result = run(self.camera, self.store)
+        self.assertEqual(result.changed, {'information': {'FirmwareVersion': ('1.0', '1.1')}})
+        self.assertEqual(self.store.get('cam1:80', 'information')[2]['FirmwareVersion'], '1.1')
+
+    def test_removed(self):
+        run(self.camera, self.store)
+        result = run(self.camera, self.store, SECTIONS[:1])
+        self.assertEqual(result.removed, ['information'])
+        self.assertIsNone(self.store.get('cam1:80', 'information'))
+
+        async def failing(camera):
+            raise OSError('Connection reset')
+        # sections that couldn't be listed may still exist
+        result = run(self.camera, self.store, (SECTIONS[0], failing))
+        self.assertEqual(result.removed, [])
+        self.assertIsInstance(result.errors['failing'], ONVIFError)
+
+    def test_bad_section(self):
+        # a response that can't be deserialized, and a failed request
+        sections = SECTIONS + (Section('bad', 'devicemgmt', 'GetVendorSettings', None),
+                               Section('missing', 'devicemgmt', 'GetDNS', None))
+        self.responses['GetVendorSettings'] = HOSTNAME % 'cam1'
+        result = run(self.camera, self.store, sections)
+        self.assertEqual(sorted(result.errors), ['bad', 'missing'])
+        self.assertEqual(sorted(result.changed), ['hostname', 'information'])
+        self.assertIsNone(self.store.get('cam1:80', 'bad'))
+        # the other sections were stored
+        self.assertEqual(sorted(self.store.hashes('cam1:80')), ['hostname', 'information'])
+
+    def test_fleet(self):
+        cameras = [FakeCamera('cam%d' % i, self.responses) for i in range(4)]
+        # no port to build the camera id from
+        cameras.append(FakeCamera('broken', self.responses, port=None))
+
+        async def runFleet():
+            return [pair async for pair in sweepFleet(cameras, self.store, SECTIONS, limit=2)]
+        results = dict((camera.host, result) for camera, result in asyncio.run(runFleet()))
+        self.assertEqual(len(results), 5)
+        self.assertIsInstance(results.pop('broken'), ONVIFError)
+        for result in results.values():
+            self.assertEqual(result.changed, {'hostname': None, 'information': None})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# -*-coding=utf-8
+""" Event property table: parsing of PullMessages responses, and
+reconciliation of the table with the Initialized burst of a subscription
+"""
+import unittest
+
+from onvif.eventstate import EventMessage, EventStateTable, parseNotifications
+from onvif.projection import responseElement
+
+ENVELOPE = ('<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"'
+            ' xmlns:tt="http://www.onvif.org/ver10/schema"'
+            ' xmlns:tev="http://www.onvif.org/ver10/events/wsdl"'
+            ' xmlns:wsnt="http://docs.oasis-open.org/wsn/b-2"'
+            ' xmlns:ev="http://www.onvif.org/ver10/topics">'
+            '<s:Body><tev:PullMessagesResponse>'
+            '<tev:CurrentTime>2020-01-01T00:00:00Z</tev:CurrentTime>'
+            '<tev:TerminationTime>2020-01-01T00:01:00Z</tev:TerminationTime>'
+            '%s</tev:PullMessagesResponse></s:Body></s:Envelope>')
+
+NOTIFICATION = (
+    '<wsnt:NotificationMessage>'
+    '<wsnt:Topic Dialect="http://www.onvif.org/ver10/tev/topicExpression/ConcreteSet">'
+    '%(topic)s</wsnt:Topic><wsnt:Message>'
+    '<tt:Message UtcTime="2020-01-01T00:00:00Z"%(operation)s>'
+    '<tt:Source>%(source)s</tt:Source><tt:Data>%(data)s</tt:Data>'
+    '</tt:Message></wsnt:Message></wsnt:NotificationMessage>')
+
+MOTION = 'tns1:RuleEngine/CellMotionDetector/Motion'
+INPUT = 'tns1:Device/Trigger/DigitalInput'
+
+
+def items(values):
+    return ''.join('<tt:SimpleItem Name="%s" Value="%s"/>' % item for item in values.items())
+
+
+def notification(topic, operation, source, data):
+    return NOTIFICATION % {'topic': topic, 'source': items(source), 'data': items(data),
+                           'operation': ' PropertyOperation="%s"' % operation if operation else ''}
+
+
+def message(topic, operation, source, data):
+    return EventMessage(topic, tuple(sorted(source.items())), data, operation, None)
+
+
+class TestParse(unittest.TestCase):
+
+    def test_parse(self):
+        content = ENVELOPE % (
+            # the topic namespace prefix is the camera's choice
+            notification('ev:RuleEngine/CellMotionDetector/Motion', 'Changed',
+                         {'VideoSourceConfigurationToken': 'vs0', 'Rule': 'MyMotion'},
+                         {'IsMotion': 'true'})
+            + notification('tns1:VideoSource/GlobalSceneChange', None, {'Source': 'vs0'},
+                           {'State': 'true'})
+            + '<wsnt:NotificationMessage><wsnt:Topic>tns1:Broken</wsnt:Topic>'
+              '</wsnt:NotificationMessage>')
+        motion, scene = parseNotifications(responseElement(content.encode()))
+        self.assertEqual(motion.topic, MOTION)
+        self.assertEqual(motion.source, (('Rule', 'MyMotion'),
+                                         ('VideoSourceConfigurationToken', 'vs0')))
+        self.assertEqual(motion.data, {'IsMotion': 'true'})
+        self.assertEqual(motion.operation, 'Changed')
+        self.assertEqual(motion.utcTime, '2020-01-01T00:00:00Z')
+        self.assertEqual(scene.topic, 'tns1:VideoSource/GlobalSceneChange')
+        self.assertIsNone(scene.operation)
+
+    def test_element_items(self):
+        content = ENVELOPE % NOTIFICATION % {
+            'topic': 'tns1:Custom', 'operation': ' PropertyOperation="Initialized"',
+            'source': '', 'data': '<tt:ElementItem Name="Box"><tt:Rect left="1"/></tt:ElementItem>'}
+        event, = parseNotifications(responseElement(content.encode()))
+        self.assertIn('Rect', event.data['Box'])
+        self.assertIn('left="1"', event.data['Box'])
+
+
+class TestTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = EventStateTable()
+        self.table.beginSync('cam')
+        for msg in (message(MOTION, 'Initialized', {'Source': 'vs0'}, {'IsMotion': 'false'}),
+                    message(INPUT, 'Initialized', {'InputToken': 'in0'}, {'LogicalState': 'false'}),
+                    message(INPUT, 'Initialized', {'InputToken': 'in1'}, {'LogicalState': 'true'})):
+            self.table.apply('cam', msg)
+        self.assertEqual(self.table.endSync('cam'), 0)
+
+    def test_apply(self):
+        table = self.table
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.get('cam', MOTION, {'Source': 'vs0'}), {'IsMotion': 'false'})
+        self.assertTrue(table.apply('cam', message(MOTION, 'Changed', {'Source': 'vs0'},
+                                                   {'IsMotion': 'true'})))
+        # same data, and events that aren't properties: no change
+        self.assertFalse(table.apply('cam', message(MOTION, 'Changed', {'Source': 'vs0'},
+                                                    {'IsMotion': 'true'})))
+        self.assertFalse(table.apply('cam', message(MOTION, None, {'Source': 'vs0'},
+                                                    {'IsMotion': 'false'})))
+        self.assertTrue(table.apply('cam', message(INPUT, 'Deleted', {'InputToken': 'in1'}, {})))
+        self.assertIsNone(table.get('cam', INPUT, {'InputToken': 'in1'}))
+        self.assertEqual(len(table), 2)
+
+    def test_resync(self):
+        table = self.table
+        before = table.snapshot('cam')
+        # new subscription: in1 is no longer part of the Initialized burst
+        table.beginSync('cam')
+        table.apply('cam', message(MOTION, 'Initialized', {'Source': 'vs0'}, {'IsMotion': 'true'}))
+        table.apply('cam', message(INPUT, 'Initialized', {'InputToken': 'in0'},
+                                   {'LogicalState': 'false'}))
+        # properties still unconfirmed are kept during the burst
+        self.assertEqual(table.get('cam', INPUT, {'InputToken': 'in1'}), {'LogicalState': 'true'})
+        self.assertEqual(table.endSync('cam'), 1)
+        self.assertEqual(EventStateTable.diff(before, table.snapshot('cam')), {
+            ('cam', MOTION, (('Source', 'vs0'),)): ({'IsMotion': 'false'}, {'IsMotion': 'true'}),
+            ('cam', INPUT, (('InputToken', 'in1'),)): ({'LogicalState': 'true'}, None)})
+
+    def test_cameras_are_separate(self):
+        table = self.table
+        table.beginSync('other')
+        table.apply('other', message(MOTION, 'Initialized', {'Source': 'vs0'},
+                                     {'IsMotion': 'true'}))
+        self.assertEqual(table.endSync('other'), 0)
+        self.assertEqual(len(table.snapshot('cam')), 3)
+        self.assertEqual(len(table.snapshot(topic=MOTION)), 2)
+        table.clear('cam')
+        self.assertEqual(len(table), 1)
+        self.assertEqual(table.get('other', MOTION, {'Source': 'vs0'}), {'IsMotion': 'true'})
+
+
+if __name__ == '__main__':
+    unittest.main()
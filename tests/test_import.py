@@ -0,0 +1,54 @@
+#!/usr/bin/python
+# -*-coding=utf-8
+""" Import time benchmark: `import onvif` must stay cheap and side effect free
+"""
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budget for the cumulative import time of the `onvif` package, in microseconds
+IMPORT_BUDGET = 25000
+HEAVY_MODULES = ('zeep', 'lxml', 'aiohttp')
+
+
+def run(code):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+
+
+def cumulative(importtime, module):
+    """ cumulative import time of `module` from `-X importtime` output """
+    for line in importtime.splitlines():
+        if line.startswith('import time:') and line.rsplit('|', 1)[-1].strip() == module:
+            return int(line.split('|')[1])
+    raise AssertionError('%s not imported' % module)
+
+
+class TestImport(unittest.TestCase):
+
+    def test_import_budget(self):
+        best = min(cumulative(run('import onvif').stderr, 'onvif') for _ in range(3))
+        print('import onvif: %d us (budget %d us)' % (best, IMPORT_BUDGET))
+        self.assertLess(best, IMPORT_BUDGET)
+
+    def test_no_heavy_import(self):
+        code = ('import sys, onvif; '
+                'print(" ".join(m for m in %r if m in sys.modules))' % (HEAVY_MODULES,))
+        self.assertEqual(run(code).stdout.strip(), '')
+
+    def test_no_side_effects(self):
+        code = 'import logging, onvif; print(len(logging.getLogger().handlers))'
+        self.assertEqual(run(code).stdout.strip(), '0')
+
+    def test_lazy_names(self):
+        code = 'import onvif; print(onvif.ONVIFCamera.__module__)'
+        self.assertEqual(run(code).stdout.strip(), 'onvif.client')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/python
+# -*-coding=utf-8
+""" Media profiles through Media2 or the Media1 fallback, and discovery of
+Media2 in the GetServices response of `update_xaddrs`
+"""
+import asyncio
+import unittest
+
+from onvif.client import ONVIFCamera
+from onvif.definition import SERVICES
+from onvif.profiles import getProfiles
+from onvif.projection import compile as compileProjection
+
+from test_search import CAPABILITIES
+from test_serialize import ENVELOPE, NS, PROFILE, reply
+
+MEDIA2_PROFILES = (
+    '<tr2:GetProfilesResponse xmlns:tr2="http://www.onvif.org/ver20/media/wsdl">'
+    '<tr2:Profiles token="main" fixed="true"><tr2:Name>MainStream</tr2:Name>'
+    '<tr2:Configurations>'
+    '<tr2:VideoEncoder token="ve0" GovLength="50" Profile="Main"><tt:Name>ve</tt:Name>'
+    '<tt:UseCount>1</tt:UseCount><tt:Encoding>H264</tt:Encoding>'
+    '<tt:Resolution><tt:Width>1920</tt:Width><tt:Height>1080</tt:Height></tt:Resolution>'
+    '<tt:Quality>5</tt:Quality></tr2:VideoEncoder>'
+    '</tr2:Configurations></tr2:Profiles>'
+    '</tr2:GetProfilesResponse>')
+
+SERVICE = ('<tds:Service><tds:Namespace>%s</tds:Namespace><tds:XAddr>%s</tds:XAddr>'
+           '<tds:Version><tt:Major>2</tt:Major><tt:Minor>60</tt:Minor></tds:Version>'
+           '</tds:Service>')
+GET_SERVICES = ENVELOPE % {'ns': NS, 'body': (
+    '<tds:GetServicesResponse xmlns:tds="http://www.onvif.org/ver10/device/wsdl">%s'
+    '</tds:GetServicesResponse>' % ''.join(SERVICE % service for service in (
+        (SERVICES['devicemgmt'].ns, 'http://cam/onvif/device_service'),
+        (SERVICES['media'].ns, 'http://cam/onvif/services'),
+        (SERVICES['media2'].ns, 'http://cam/onvif/media2'),
+        (SERVICES['ptz'].ns, ''),
+        ('urn:vendor', 'http://cam/onvif/vendor'))))}
+
+
+class FakeService:
+    """ service answering its operations with canned results (raised if errors) """
+
+    def __init__(self, **results):
+        self.results = results
+        self.calls = []
+
+    def __getattr__(self, name):
+        if name not in self.results:
+            raise AttributeError(name)
+
+        async def operation(params=None):
+            self.calls.append((name, params))
+            result = self.results[name]
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return operation
+
+
+class FakeCamera:
+
+    def __init__(self, services):
+        self.host = 'cam'
+        self.services = services
+
+    def supports(self, name):
+        return name in self.services
+
+    def getService(self, name):
+        return self.services[name]
+
+
+class FakeProjected:
+    """ operation projecting a canned response, or raising `error` """
+
+    def __init__(self, content, error=None):
+        self.content = content
+        self.error = error
+
+    async def project(self, params, *fields, each=None, asDict=False):
+        if self.error is not None:
+            raise self.error
+        return compileProjection(fields, each, asDict)(self.content.encode())
+
+
+class FakeDeviceMgmt:
+
+    def __init__(self, getServices):
+        self.GetServices = getServices
+
+    async def GetCapabilities(self, params):
+        return reply('devicemgmt', 'GetCapabilities', CAPABILITIES)
+
+
+def profiles(camera, types=None, token=None):
+    return asyncio.run(getProfiles(camera, types, token))
+
+
+async def updateXAddrs(getServices):
+    camera = ONVIFCamera('cam', 80, 'user', 'pass')
+    devicemgmt = FakeDeviceMgmt(getServices)
+
+    def getService(name):
+        if name == 'devicemgmt':
+            return devicemgmt
+        raise AttributeError(name)
+
+    camera.getService = getService
+    try:
+        await camera.update_xaddrs()
+    finally:
+        await camera.transport.session.close()
+    return camera
+
+
+class TestProfiles(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media2 = reply('media2', 'GetProfiles', MEDIA2_PROFILES)
+        cls.media1 = reply('media', 'GetProfiles',
+                           '<trt:GetProfilesResponse>%s</trt:GetProfilesResponse>'
+                           % ''.join(PROFILE % {'i': i} for i in range(2)))
+
+    def test_media2(self):
+        media2 = FakeService(GetProfiles=self.media2)
+        camera = FakeCamera({'media2': media2, 'media': FakeService()})
+        profile, = profiles(camera, ('VideoEncoder', 'Metadata'), token='main')
+        self.assertEqual(media2.calls, [('GetProfiles', {'Type': ['Metadata', 'VideoEncoder'],
+                                                         'Token': 'main'})])
+        self.assertEqual((profile.token, profile.name, profile.fixed),
+                         ('main', 'MainStream', True))
+        self.assertEqual(list(profile.configurations), ['VideoEncoder'])
+        self.assertEqual(profile.configurations['VideoEncoder'].Resolution.Width, 1920)
+        profiles(camera)
+        self.assertEqual(media2.calls[1], ('GetProfiles', {'Type': ['All']}))
+
+    def test_media1_fallback(self):
+        media2 = FakeService(GetProfiles=OSError('Connection reset'))
+        media = FakeService(GetProfiles=self.media1)
+        camera = FakeCamera({'media2': media2, 'media': media})
+        with self.assertLogs('onvif', 'WARNING'):
+            first, second = profiles(camera, ('VideoEncoder',))
+        self.assertEqual(media.calls, [('GetProfiles', None)])
+        self.assertEqual((first.token, second.token), ('p0', 'p1'))
+        # filtered to the requested types
+        self.assertEqual(list(first.configurations), ['VideoEncoder'])
+        self.assertEqual(first.configurations['VideoEncoder'].Encoding, 'H264')
+
+    def test_media1(self):
+        media = FakeService(GetProfiles=self.media1)
+        first, _ = profiles(FakeCamera({'media': media}))
+        self.assertEqual(sorted(first.configurations), ['VideoEncoder', 'VideoSource'])
+        media = FakeService(GetProfile=self.media1[1])
+        profile, = profiles(FakeCamera({'media': media}), token='p1')
+        self.assertEqual(media.calls, [('GetProfile', {'ProfileToken': 'p1'})])
+        self.assertEqual(profile.token, 'p1')
+
+
+class TestServices(unittest.TestCase):
+
+    def test_get_services(self):
+        camera = asyncio.run(updateXAddrs(FakeProjected(GET_SERVICES)))
+        self.assertTrue(camera.supports('media2'))
+        self.assertEqual(camera.xaddrs[SERVICES['media2'].ns], 'http://cam/onvif/media2')
+        # GetCapabilities addresses take precedence
+        self.assertEqual(camera.xaddrs[SERVICES['media'].ns], 'http://cam/onvif/media')
+        self.assertEqual(camera.xaddrs[SERVICES['search'].ns], 'http://cam/onvif/search')
+        # empty addresses and unknown services are ignored
+        self.assertFalse(camera.supports('ptz'))
+        self.assertNotIn('urn:vendor', camera.xaddrs)
+
+    def test_no_get_services(self):
+        camera = asyncio.run(updateXAddrs(FakeProjected('', OSError('Not supported'))))
+        self.assertFalse(camera.supports('media2'))
+        self.assertEqual(camera.xaddrs[SERVICES['media'].ns], 'http://cam/onvif/media')
+
+
+if __name__ == '__main__':
+    unittest.main()
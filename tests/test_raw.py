@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*-coding=utf-8
+""" Raw responses: fault detection, later deserialization, and services
+created after a raw response was deserialized
+"""
+import asyncio
+import unittest
+
+from aiohttp import web
+
+from onvif.client import ONVIFService, WSDLCache
+from onvif.definition import SERVICES
+from onvif.exceptions import ONVIFError
+from onvif.raw import RawResponse, _operation, checkFault, deserialize
+from onvif.transport import ONVIFTransport
+
+from test_serialize import ENVELOPE, NS, ROOT
+
+DEVICE = SERVICES['devicemgmt']
+WSDL = ROOT / 'wsdl' / DEVICE.wsdl
+BINDING = '{%s}%s' % (DEVICE.ns, DEVICE.binding)
+
+INFORMATION = (ENVELOPE % {'ns': NS, 'body': (
+    '<tds:GetDeviceInformationResponse xmlns:tds="http://www.onvif.org/ver10/device/wsdl">'
+    '<tds:Manufacturer>Acme</tds:Manufacturer><tds:Model>C1</tds:Model>'
+    '<tds:FirmwareVersion>1.0</tds:FirmwareVersion><tds:SerialNumber>42</tds:SerialNumber>'
+    '<tds:HardwareId>1</tds:HardwareId></tds:GetDeviceInformationResponse>')}).encode()
+FAULT = (ENVELOPE % {'ns': NS, 'body': (
+    '<s:Fault><s:Code><s:Value>s:Sender</s:Value></s:Code>'
+    '<s:Reason><s:Text xml:lang="en">Not authorized</s:Text></s:Reason></s:Fault>')}).encode()
+
+
+async def fetch():
+    """ GetDeviceInformation of a local server, through a service and raw """
+    async def handle(request):
+        return web.Response(body=INFORMATION, content_type='application/soap+xml')
+
+    app = web.Application()
+    app.router.add_post('/onvif/device_service', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  #pylint: disable=protected-access
+    transport = ONVIFTransport()
+    try:
+        service = ONVIFService('http://127.0.0.1:%d/onvif/device_service' % port, None, WSDL,
+                               bindingName=BINDING, transport=transport)
+        return (await service.GetDeviceInformation(),
+                await service.GetDeviceInformation.raw())
+    finally:
+        await transport.session.close()
+        await runner.cleanup()
+
+
+class TestRaw(unittest.TestCase):
+
+    def test_check_fault(self):
+        checkFault(INFORMATION)
+        with self.assertRaises(ONVIFError):
+            checkFault(FAULT, 500)
+        # error pages aren't SOAP responses
+        with self.assertRaises(ONVIFError):
+            checkFault(b'<html>Internal Server Error</html>', 500)
+        checkFault(INFORMATION, 500)
+
+    def test_deserialize(self):
+        info = deserialize(INFORMATION, 'GetDeviceInformation', WSDL, BINDING)
+        self.assertEqual((info.Manufacturer, info.SerialNumber), ('Acme', '42'))
+        raw = RawResponse(WSDL, BINDING, 'GetDeviceInformation', INFORMATION)
+        self.assertEqual(raw.parse().Model, 'C1')
+        with self.assertRaises(ONVIFError):
+            deserialize(FAULT, 'GetDeviceInformation', WSDL, BINDING)
+        with self.assertRaises(ONVIFError):
+            deserialize(b'<not xml', 'GetDeviceInformation', WSDL, BINDING)
+        with self.assertRaises(ONVIFError):
+            deserialize(INFORMATION, 'NoSuchOperation', WSDL, BINDING)
+
+    def test_service_after_deserialize(self):
+        # a document parsed to deserialize must not give sync bindings to services
+        WSDLCache.clear()
+        _operation.cache_clear()
+        deserialize(INFORMATION, 'GetDeviceInformation', WSDL, BINDING)
+        info, raw = asyncio.run(fetch())
+        self.assertEqual(info.Manufacturer, 'Acme')
+        self.assertEqual(raw.content, INFORMATION)
+        self.assertEqual(raw.parse().Manufacturer, 'Acme')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/python
+# -*-coding=utf-8
+""" Search sessions against a fake search service, and discovery of the
+search service address in GetCapabilities
+"""
+import asyncio
+from types import SimpleNamespace
+import unittest
+
+from onvif.client import capabilityXAddrs
+from onvif.search import SearchSession
+
+from test_serialize import reply
+
+CAPABILITIES = (
+    '<tds:GetCapabilitiesResponse xmlns:tds="http://www.onvif.org/ver10/device/wsdl">'
+    '<tds:Capabilities>'
+    '<tt:Device><tt:XAddr>http://cam/onvif/device_service</tt:XAddr></tt:Device>'
+    '<tt:Media><tt:XAddr>http://cam/onvif/media</tt:XAddr><tt:StreamingCapabilities/></tt:Media>'
+    '<tt:Extension>'
+    '<tt:Recording><tt:XAddr>http://cam/onvif/recording</tt:XAddr>'
+    '<tt:ReceiverSource>false</tt:ReceiverSource><tt:MediaProfileSource>true</tt:MediaProfileSource>'
+    '<tt:DynamicRecordings>false</tt:DynamicRecordings><tt:DynamicTracks>false</tt:DynamicTracks>'
+    '<tt:MaxStringLength>64</tt:MaxStringLength></tt:Recording>'
+    '<tt:Search><tt:XAddr>http://cam/onvif/search</tt:XAddr>'
+    '<tt:MetadataSearch>false</tt:MetadataSearch></tt:Search>'
+    '<tt:Replay><tt:XAddr>http://cam/onvif/replay</tt:XAddr></tt:Replay>'
+    '</tt:Extension></tds:Capabilities></tds:GetCapabilitiesResponse>')
+
+
+class FakeSearch:
+    """ search service returning `total` recordings, with a latency per page """
+
+    def __init__(self, total, latency=0.0):
+        self.total = total
+        self.latency = latency
+        self.sent = 0
+        self.requests = []
+        self.ended = []
+
+    async def FindRecordings(self, params):
+        return 'token'
+
+    async def GetRecordingSearchResults(self, params):
+        self.requests.append(params['MaxResults'])
+        await asyncio.sleep(self.latency)
+        count = min(params['MaxResults'], self.total - self.sent)
+        items = list(range(self.sent, self.sent + count))
+        self.sent += count
+        state = 'Completed' if self.sent >= self.total else 'Searching'
+        return SimpleNamespace(RecordingInformation=items, SearchState=state)
+
+    async def EndSearch(self, params):
+        self.ended.append(params['SearchToken'])
+
+
+async def collect(session, stopAfter=None):
+    items = []
+    async for item in session:
+        items.append(item)
+        if len(items) == stopAfter:
+            break
+    return items
+
+
+class TestSearch(unittest.TestCase):
+
+    def test_extension_xaddrs(self):
+        xaddrs = dict(capabilityXAddrs(reply('devicemgmt', 'GetCapabilities', CAPABILITIES)))
+        self.assertEqual(xaddrs['Media'], 'http://cam/onvif/media')
+        self.assertEqual(xaddrs['Search'], 'http://cam/onvif/search')
+        self.assertEqual(xaddrs['Recording'], 'http://cam/onvif/recording')
+        self.assertEqual(xaddrs['Replay'], 'http://cam/onvif/replay')
+
+    def test_adapt(self):
+        session = SearchSession(FakeSearch(0), 'recordings', {}, pageSize=32,
+                                minPageSize=4, maxPageSize=64, targetLatency=1)
+        session.adapt(0.1, 32)     # full and fast: doubled
+        self.assertEqual(session.pageSize, 64)
+        session.adapt(0.1, 64)     # capped
+        self.assertEqual(session.pageSize, 64)
+        session.adapt(0.1, 10)     # not full: kept
+        self.assertEqual(session.pageSize, 64)
+        session.adapt(0.7, 64)     # neither fast nor slow: kept
+        self.assertEqual(session.pageSize, 64)
+        for _ in range(5):         # slow: halved down to the minimum
+            session.adapt(2, 64)
+        self.assertEqual(session.pageSize, 4)
+        self.assertEqual(session.latency, 2)
+
+    def test_pages(self):
+        service = FakeSearch(100)
+        session = SearchSession(service, 'recordings', {}, pageSize=8)
+        self.assertEqual(asyncio.run(collect(session)), list(range(100)))
+        self.assertEqual(service.requests[:3], [8, 16, 32])
+        self.assertEqual(service.ended, ['token'])
+        self.assertEqual(session.state, 'Completed')
+        self.assertIsNone(session.token)
+
+    def test_early_stop(self):
+        service = FakeSearch(100)
+        session = SearchSession(service, 'recordings', {}, pageSize=8)
+        self.assertEqual(asyncio.run(collect(session, stopAfter=3)), [0, 1, 2])
+        # the token is released even though the search isn't over
+        self.assertEqual(service.ended, ['token'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*-coding=utf-8
+""" Serializer benchmark: `toDict` must match `zeep.helpers.serialize_object`
+and be faster on large responses
+"""
+import json
+import os
+import timeit
+import unittest
+from pathlib import Path
+
+import zeep.helpers
+
+from onvif.definition import SERVICES
+from onvif.raw import deserialize
+from onvif.serialize import toDict, toJson
+
+ROOT = Path(__file__).resolve().parent.parent
+NS = 'http://www.onvif.org/ver10/'
+ENVELOPE = ('<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"'
+            ' xmlns:tt="%(ns)sschema" xmlns:trt="%(ns)smedia/wsdl" xmlns:tev="%(ns)sevents/wsdl"'
+            ' xmlns:tns1="http://www.onvif.org/ver10/topics"'
+            ' xmlns:wsnt="http://docs.oasis-open.org/wsn/b-2"'
+            ' xmlns:wstop="http://docs.oasis-open.org/wsn/t-1">'
+            '<s:Body>%(body)s</s:Body></s:Envelope>')
+
+PROFILE = (
+    '<trt:Profiles token="p%(i)d" fixed="true"><tt:Name>Profile %(i)d</tt:Name>'
+    '<tt:VideoSourceConfiguration token="vs%(i)d"><tt:Name>vs</tt:Name><tt:UseCount>2</tt:UseCount>'
+    '<tt:SourceToken>src</tt:SourceToken><tt:Bounds x="0" y="0" width="1920" height="1080"/>'
+    '</tt:VideoSourceConfiguration>'
+    '<tt:VideoEncoderConfiguration token="ve%(i)d"><tt:Name>ve</tt:Name><tt:UseCount>1</tt:UseCount>'
+    '<tt:Encoding>H264</tt:Encoding><tt:Resolution><tt:Width>1920</tt:Width><tt:Height>1080</tt:Height>'
+    '</tt:Resolution><tt:Quality>5</tt:Quality><tt:RateControl><tt:FrameRateLimit>25</tt:FrameRateLimit>'
+    '<tt:EncodingInterval>1</tt:EncodingInterval><tt:BitrateLimit>4096</tt:BitrateLimit></tt:RateControl>'
+    '<tt:H264><tt:GovLength>50</tt:GovLength><tt:H264Profile>Main</tt:H264Profile></tt:H264>'
+    '<tt:Multicast><tt:Address><tt:Type>IPv4</tt:Type><tt:IPv4Address>0.0.0.0</tt:IPv4Address>'
+    '</tt:Address><tt:Port>0</tt:Port><tt:TTL>1</tt:TTL><tt:AutoStart>false</tt:AutoStart></tt:Multicast>'
+    '<tt:SessionTimeout>PT60S</tt:SessionTimeout></tt:VideoEncoderConfiguration>'
+    '<tt:Extension><x:Vendor xmlns:x="urn:vendor">%(i)d</x:Vendor></tt:Extension>'
+    '</trt:Profiles>')
+
+TOPIC = (
+    '<tns1:Topic%(i)d wstop:topic="true"><tt:MessageDescription IsProperty="true">'
+    '<tt:Source><tt:SimpleItemDescription Name="VideoSourceConfigurationToken" Type="tt:ReferenceToken"/>'
+    '</tt:Source><tt:Data><tt:SimpleItemDescription Name="State" Type="xs:boolean"/></tt:Data>'
+    '</tt:MessageDescription></tns1:Topic%(i)d>')
+
+EVENT_PROPERTIES = (
+    '<tev:GetEventPropertiesResponse>'
+    '<tev:TopicNamespaceLocation>http://www.onvif.org/onvif/ver10/topics/topicns.xml</tev:TopicNamespaceLocation>'
+    '<wsnt:FixedTopicSet>true</wsnt:FixedTopicSet><wstop:TopicSet>%s</wstop:TopicSet>'
+    '<wsnt:TopicExpressionDialect>http://www.onvif.org/ver10/tev/topicExpression/ConcreteSet</wsnt:TopicExpressionDialect>'
+    '<tev:MessageContentFilterDialect>http://www.onvif.org/ver10/tev/messageContentFilter/ItemFilter</tev:MessageContentFilterDialect>'
+    '<tev:MessageContentSchemaLocation>http://www.onvif.org/onvif/ver10/schema/onvif.xsd</tev:MessageContentSchemaLocation>'
+    '</tev:GetEventPropertiesResponse>')
+
+
+def reply(name, operation, body):
+    """ deserialize a response `body` the way the service would """
+    definition = SERVICES[name]
+    return deserialize((ENVELOPE % {'ns': NS, 'body': body}).encode(), operation,
+                       ROOT / 'wsdl' / definition.wsdl,
+                       '{%s}%s' % (definition.ns, definition.binding))
+
+
+def bench(func, value, number=5):
+    return min(timeit.repeat(lambda: func(value), number=number, repeat=3)) / number
+
+
+class TestSerialize(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.profiles = reply('media', 'GetProfiles',
+                             '<trt:GetProfilesResponse>%s</trt:GetProfilesResponse>'
+                             % ''.join(PROFILE % {'i': i} for i in range(200)))
+        cls.properties = reply('events', 'GetEventProperties',
+                               EVENT_PROPERTIES % ''.join(TOPIC % {'i': i} for i in range(500)))
+
+    def test_same_as_zeep(self):
+        for response in (self.profiles, self.properties):
+            self.assertEqual(toDict(response), zeep.helpers.serialize_object(response))
+        converted = toDict(self.profiles)
+        self.assertIs(type(converted[0]), dict)
+        self.assertIs(type(converted[0]['VideoEncoderConfiguration']['Resolution']), dict)
+
+    def test_json(self):
+        profile = json.loads(toJson(self.profiles[0]))
+        self.assertEqual(profile['token'], 'p0')
+        self.assertEqual(profile['VideoEncoderConfiguration']['RateControl']['BitrateLimit'], 4096)
+        # any-content as XML strings
+        vendor, = profile['Extension']['_value_1']
+        self.assertIn('urn:vendor', vendor)
+        topics = json.loads(toJson(self.properties))['TopicSet']['_value_1']
+        self.assertEqual(len(topics), 500)
+        self.assertTrue(all(isinstance(topic, str) for topic in topics))
+
+    @unittest.skipIf(os.environ.get('ONVIF_SKIP_BENCH'), 'benchmark disabled')
+    def test_speed(self):
+        for name, response in (('GetProfiles', self.profiles),
+                               ('GetEventProperties', self.properties)):
+            zeepTime = bench(zeep.helpers.serialize_object, response)
+            ourTime = bench(toDict, response)
+            print('%s: serialize_object %.2f ms, toDict %.2f ms (x%.1f), toJson %.2f ms'
+                  % (name, zeepTime * 1e3, ourTime * 1e3, zeepTime / ourTime,
+                     bench(toJson, response) * 1e3))
+            if name == 'GetProfiles':
+                self.assertLess(ourTime, zeepTime)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+#!/usr/bin/python
+# -*-coding=utf-8
+""" Sharded fleet: request bursts through a real worker process
+"""
+import asyncio
+import unittest
+
+from onvif.exceptions import ONVIFError
+from onvif.shard import HashRing, ShardedFleet
+
+
+class TestShard(unittest.TestCase):
+
+    def test_ring(self):
+        ring = HashRing(range(4))
+        owners = {ring.get('cam%d' % i) for i in range(1000)}
+        self.assertEqual(owners, {0, 1, 2, 3})
+        before = {i: ring.get('cam%d' % i) for i in range(1000)}
+        ring.remove(3)
+        # only the keys of the removed node move
+        for i, owner in before.items():
+            if owner != 3:
+                self.assertEqual(ring.get('cam%d' % i), owner)
+
+    def test_burst(self):
+        async def run():
+            async with ShardedFleet(workers=1) as fleet:
+                # far more than a pipe buffer in both directions at once
+                results = await asyncio.wait_for(
+                    asyncio.gather(*(fleet.remove('cam%d' % i) for i in range(5000))), 60)
+                with self.assertRaises(ONVIFError):
+                    await fleet.call('cam1', 'devicemgmt', 'GetHostname')
+                with self.assertRaises(ONVIFError):
+                    await fleet.subscribe('cam1')
+            return results
+        self.assertEqual(asyncio.run(run()), [None] * 5000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/python
+# -*-coding=utf-8
+""" Snapshots: caching of the default profile and of the snapshot URIs,
+downloads from a local server
+"""
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+import aiohttp
+from aiohttp import web
+
+from onvif.auth import HTTPAuth
+from onvif.exceptions import ONVIFError
+from onvif.snapshot import fetchSnapshot
+
+JPEG = b'\xff\xd8' + b'x' * 100000 + b'\xff\xd9'
+
+
+class FakeOperation:
+
+    def __init__(self, media, name, result):
+        self.media = media
+        self.name = name
+        self.result = result
+
+    async def project(self, params, *paths, each=None):
+        self.media.calls.append(self.name)
+        return self.result(params)
+
+
+class FakeMedia:
+
+    def __init__(self, session, uri):
+        self.calls = []
+        self.client = SimpleNamespace(transport=SimpleNamespace(session=session))
+        self.GetProfiles = FakeOperation(self, 'GetProfiles', lambda params: [('main',)])
+        self.GetSnapshotUri = FakeOperation(self, 'GetSnapshotUri', lambda params: [uri])
+
+
+class FakeCamera:
+
+    def __init__(self, media):
+        self.media = media
+        self.httpAuth = HTTPAuth('admin', '12345')
+        self.snapshotUris = {}
+        self.snapshotProfile = None
+
+    def getService(self, name):
+        return self.media
+
+
+async def snapshots(statuses):
+    """ fetch a snapshot per status answered by the server; returns the
+    results and the media calls """
+    answers = iter(statuses)
+
+    async def handle(request):
+        status = next(answers)
+        if status != 200:
+            return web.Response(status=status)
+        return web.Response(body=JPEG, content_type='image/jpeg')
+
+    app = web.Application()
+    app.router.add_get('/snap', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  #pylint: disable=protected-access
+    session = aiohttp.ClientSession()
+    camera = FakeCamera(FakeMedia(session, 'http://127.0.0.1:%d/snap' % port))
+    results = []
+    try:
+        for _ in statuses:
+            try:
+                results.append(await fetchSnapshot(camera, into=bytearray(1 << 20)))
+            except ONVIFError as err:
+                results.append(err)
+    finally:
+        await session.close()
+        await runner.cleanup()
+    return results, camera.media.calls
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def test_cached(self):
+        results, calls = asyncio.run(snapshots([200, 200, 200]))
+        for shot in results:
+            self.assertEqual(shot.profile, 'main')
+            self.assertEqual(bytes(shot.data), JPEG)
+        # the profile and its URI are queried once
+        self.assertEqual(calls, ['GetProfiles', 'GetSnapshotUri'])
+
+    def test_not_found(self):
+        results, calls = asyncio.run(snapshots([200, 404, 200]))
+        self.assertIsInstance(results[1], ONVIFError)
+        self.assertEqual(results[2].size, len(JPEG))
+        # both queried again after the 404
+        self.assertEqual(calls, ['GetProfiles', 'GetSnapshotUri'] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/python
+# -*-coding=utf-8
+""" HTTP compression negotiation and authentication retries of
+`ONVIFTransport` against a local server
+"""
+import asyncio
+import gzip
+import unittest
+
+import aiohttp
+from aiohttp import web
+
+from onvif.auth import HTTPAuth
+from onvif.transport import HTTPCompression, ONVIFTransport, isEnvelope
+
+FAULT = (b'<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"><s:Body><s:Fault>'
+         b'<s:Code><s:Value>s:Sender</s:Value></s:Code>'
+         b'<s:Reason><s:Text xml:lang="en">Invalid NTP server</s:Text></s:Reason>'
+         b'</s:Fault></s:Body></s:Envelope>')
+REQUEST = b'<s:Envelope><s:Body><SetNTP>%s</SetNTP></s:Body></s:Envelope>' % (b'x' * 2048)
+
+
+async def exchange(mode, count=2):
+    """ send `count` compressed requests to a server answering in `mode`;
+    returns the Content-Encoding of the requests it received, the statuses
+    and the compression state
+    """
+    received = []
+
+    async def handle(request):
+        encoding = request.headers.get('Content-Encoding')
+        received.append(encoding)
+        if encoding and mode == 'reject':
+            return web.Response(status=415, text='Unsupported Media Type')
+        if mode == 'error' and len(received) > 1:
+            return web.Response(status=500, text='Internal Server Error')
+        if mode == 'fault':
+            return web.Response(status=500, body=gzip.compress(FAULT),
+                                headers={'Content-Encoding': 'gzip'},
+                                content_type='application/soap+xml')
+        return web.Response(body=FAULT.replace(b'Fault', b'Response'),
+                            content_type='application/soap+xml')
+
+    app = web.Application()
+    app.router.add_post('/onvif', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  #pylint: disable=protected-access
+    compression = HTTPCompression(compressAbove=1024)
+    transport = ONVIFTransport(compression=compression)
+    statuses = []
+    try:
+        for _ in range(count):
+            response = await transport.post('http://127.0.0.1:%d/onvif' % port, REQUEST, {})
+            statuses.append(response.status)
+            await transport.new_response(response)
+    finally:
+        await transport.session.close()
+        await runner.cleanup()
+    return received, statuses, compression
+
+
+async def challenged():
+    """ post to a server asking for Digest credentials, through a pool of a
+    single connection; returns the status and the Authorization headers received
+    """
+    received = []
+
+    async def handle(request):
+        received.append(request.headers.get('Authorization'))
+        if 'Authorization' not in request.headers:
+            return web.Response(status=401, text='Unauthorized' * 100000, headers={
+                'WWW-Authenticate': 'Digest realm="cam", nonce="abc", qop="auth"'})
+        return web.Response(body=FAULT.replace(b'Fault', b'Response'),
+                            content_type='application/soap+xml')
+
+    app = web.Application()
+    app.router.add_post('/onvif', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  #pylint: disable=protected-access
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=1))
+    transport = ONVIFTransport(auth=HTTPAuth('admin', '12345'), session=session)
+    try:
+        response = await asyncio.wait_for(
+            transport.post('http://127.0.0.1:%d/onvif' % port, REQUEST, {}), 5)
+        await transport.new_response(response)
+    finally:
+        await session.close()
+        await runner.cleanup()
+    return response.status, received
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_is_envelope(self):
+        self.assertTrue(isEnvelope(FAULT))
+        self.assertTrue(isEnvelope(gzip.compress(FAULT), 'gzip'))
+        self.assertFalse(isEnvelope(b'<html>415 Unsupported Media Type</html>'))
+        self.assertFalse(isEnvelope(gzip.compress(b'Unsupported'), 'gzip'))
+
+    def test_accepted(self):
+        received, statuses, compression = asyncio.run(exchange('accept'))
+        self.assertEqual(received, ['gzip', 'gzip'])
+        self.assertEqual(statuses, [200, 200])
+        self.assertIs(compression.acceptsRequests, True)
+
+    def test_fault_not_resent(self):
+        received, statuses, compression = asyncio.run(exchange('fault'))
+        # one request per call: the fault answers the compressed request
+        self.assertEqual(received, ['gzip', 'gzip'])
+        self.assertEqual(statuses, [500, 500])
+        self.assertIsNone(compression.acceptsRequests)
+
+    def test_known_support_not_resent(self):
+        received, statuses, compression = asyncio.run(exchange('error'))
+        self.assertEqual(received, ['gzip', 'gzip'])
+        self.assertEqual(statuses, [200, 500])
+        self.assertIs(compression.acceptsRequests, True)
+
+    def test_rejected(self):
+        received, statuses, compression = asyncio.run(exchange('reject'))
+        self.assertEqual(received, ['gzip', None, None])
+        self.assertEqual(statuses, [200, 200])
+        self.assertIs(compression.acceptsRequests, False)
+
+
+class TestAuthentication(unittest.TestCase):
+
+    def test_challenge_released(self):
+        # the retry needs the connection of the 401 response
+        status, received = asyncio.run(challenged())
+        self.assertEqual(status, 200)
+        self.assertIsNone(received[0])
+        self.assertTrue(received[1].startswith('Digest '))
+
+
+if __name__ == '__main__':
+    unittest.main()